@@ -0,0 +1,36 @@
+"""
+Measure the overhead of calling a jit function, compared with calling the compiled function directly.
+"""
+import timeit
+
+from staticpy import jit, Long
+from staticpy.common.options import set_option
+
+
+def identity(n: Long) -> Long:
+    return n
+
+
+set_option("replace_global", True)
+
+
+@jit
+def replaced(n: Long) -> Long:
+    return n
+
+
+def per_call(func, number):
+    """
+    The time of one call in nanoseconds
+    """
+    return timeit.timeit("func(1)", number=number, globals={"func": func}) / number * 1e9
+
+
+if __name__ == "__main__":
+    number = 1000000
+    fn = jit(identity)
+    fn(1)
+    replaced(1)
+    print(f"compiled function: {per_call(fn.compiled, number):6.0f} ns per call")
+    print(f"jit object:        {per_call(fn, number):6.0f} ns per call")
+    print(f"replaced global:   {per_call(replaced, number):6.0f} ns per call")
@@ -0,0 +1,43 @@
+"""
+Measure the time to compile a jit function, with and without the precompiled header.
+"""
+import shutil
+import tempfile
+import time
+
+from staticpy import jit, Double, Int
+from staticpy.common import logging
+from staticpy.common.options import set_option
+
+
+def kernel(x: Double[:], n: Int) -> Double:
+    s: Double = 0.0
+    i: Int
+    for i in range(n):
+        s += x[i] * x[i]
+    return s
+
+
+def compile_time(precompiled_header, repeat):
+    cache_dir = tempfile.mkdtemp()
+    set_option("cache_dir", cache_dir)
+    set_option("precompiled_header", precompiled_header)
+    set_option("force_compile", True)
+    try:
+        # the first build also builds the precompiled header
+        jit(kernel).compile()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            jit(kernel).compile()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    logging.set_logging_level(logging.LoggingLevel.DEBUG - 1)
+    repeat = 3
+    without = compile_time(False, repeat)
+    with_pch = compile_time(True, repeat)
+    print(f"without precompiled header: {without:.2f}s per kernel")
+    print(f"with precompiled header:    {with_pch:.2f}s per kernel")
@@ -0,0 +1,111 @@
+"""
+Measure the time and memory it takes to translate large kernels into C++.
+
+The source is parsed beforehand. Times are the best of a few runs, made without
+garbage collection like `timeit` does. Memory is what the translated function
+holds on to once it's rendered, and the peak of translating and rendering it.
+
+The git revisions given as arguments are measured first, as baselines, each in a
+temporary worktree.
+"""
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from staticpy import Double, Int
+from staticpy.session import new_session
+from staticpy.translator import BaseTranslator
+
+
+def make_kernel(statements, terms):
+    """
+    The source of a kernel updating an array with `statements` sums of `terms` products each.
+    """
+    lines = [
+        "def kernel(x: Double[:, :, :], y: Double[:, :, :].mut, a: Double, b: Double):",
+        "    i: Int",
+        "    j: Int",
+        "    k: Int",
+        "    for i in range(1, x.shape[0] - 1):",
+        "        for j in range(1, x.shape[1] - 1):",
+        "            for k in range(1, x.shape[2] - 1):",
+    ]
+    for n in range(statements):
+        products = " + ".join(f"(a * x[i + {t % 3 - 1}, j, k - {t % 2}] - b / {t + 2}) * {n + 1}" for t in range(terms))
+        lines.append(f"                y[i, j, k] += {products}")
+    return "\n".join(lines)
+
+
+def translator():
+    return BaseTranslator({"Double": Double, "Int": Int}, session=new_session())
+
+
+def translate(source, tree):
+    return translator().translate(source, tree)
+
+
+def render(block):
+    return "\n".join(block.translate())
+
+
+def measure(name, source, repeat=5):
+    source, tree = translator().parse(source)
+    translation = rendering = float("inf")
+    gc.disable()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        block = translate(source, tree)
+        translation = min(translation, time.perf_counter() - start)
+        start = time.perf_counter()
+        code = render(block)
+        rendering = min(rendering, time.perf_counter() - start)
+    gc.enable()
+    del block
+    tracemalloc.start()
+    block = translate(source, tree)
+    render(block)
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {len(source.splitlines())} lines, {len(code)} characters of C++")
+    print(f"  translation:  {translation * 1000:8.1f} ms")
+    print(f"  rendering:    {rendering * 1000:8.1f} ms")
+    print(f"  held memory:  {held / 2 ** 20:8.1f} MiB")
+    print(f"  peak memory:  {peak / 2 ** 20:8.1f} MiB")
+
+
+def measure_revision(revision):
+    """
+    Run the benchmark on the tree of a git revision.
+    """
+    subject = subprocess.run(["git", "log", "-1", "--format=%h %s", revision], check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    print(f"baseline {subject}")
+    sys.stdout.flush()
+    root = tempfile.mkdtemp()
+    path = os.path.join(root, "tree")
+    subprocess.run(["git", "worktree", "add", "--detach", "-q", path, revision], check=True)
+    try:
+        script = shutil.copy(__file__, path)
+        subprocess.run([sys.executable, script], cwd=path, env=dict(os.environ, PYTHONPATH=path), check=True)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", path], check=True)
+        shutil.rmtree(root)
+
+
+def main(baselines):
+    for revision in baselines:
+        measure_revision(revision)
+    if baselines:
+        print("this tree")
+    measure("many short statements", make_kernel(200, 20))
+    measure("few long statements", make_kernel(10, 150))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,5 +1,8 @@
 from .jit import jit
+from .pool import precompile
+from .ufunc import vectorize
 from .lang.type import *
 from .util.helper import Cls
 from .util.extern import ExternalFunction
 from .common.phase import LibFunction, likely, unlikely
+from .lib.parallel import prange
@@ -0,0 +1,36 @@
+import argparse
+import importlib.util
+import os
+import sys
+
+
+def resolve_root(package):
+    """
+    The directory of `package`, given either as a path or as an importable name.
+    """
+    if os.path.isdir(package):
+        return os.path.abspath(package)
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        raise SystemExit(f"`{package}` is neither a directory nor a package")
+    return list(spec.submodule_search_locations)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m staticpy")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    build = commands.add_parser("build", help="compile the jit functions of a package ahead of time")
+    build.add_argument("package", help="path or name of the package")
+    build.add_argument("-j", "--workers", type=int, default=None, help="number of parallel compilations")
+    build.add_argument("--march", default=None,
+                       help="target of -march, by default the baseline of the architecture, such as x86-64")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        from .aot import build_package
+        manifest = build_package(resolve_root(args.package), workers=args.workers, march=args.march)
+        print(f"wrote {manifest}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
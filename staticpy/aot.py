@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+import inspect
+import os
+import platform
+import shutil
+import sys
+
+from .common import logging
+from .common.options import get_option, set_option
+from .common.string import get_extension_suffix
+from .compiler import Compiler
+from .jit import JitObject, build_library
+from .prebuilt import DIRNAME, artifact_id, is_staticpy_module, write_manifest
+
+
+def find_sources(root):
+    """
+    Yield (module name, filename) of the Python files under `root`.
+
+    `root` is either a package, whose modules are named after it, or a plain
+    directory of top-level modules.
+    """
+    root = os.path.abspath(root)
+    if os.path.exists(os.path.join(root, "__init__.py")):
+        prefix = [os.path.basename(root)]
+    else:
+        prefix = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name != DIRNAME and not name.startswith("."))
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            parts = os.path.relpath(os.path.join(dirpath, filename[:-3]), root).split(os.sep)
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            yield ".".join(prefix + parts), os.path.join(dirpath, filename)
+
+
+def find_jit_objects(root):
+    """
+    Yield (artifact id, jit object) of every `# @staticpy` module and every jit
+    function defined at the top level of a module under `root`. Modules using jit
+    functions are imported to find them.
+    """
+    root = os.path.abspath(root)
+    path = os.path.dirname(root) if os.path.exists(os.path.join(root, "__init__.py")) else root
+    sys.path.insert(0, path)
+    try:
+        yield from _find_jit_objects(root)
+    finally:
+        sys.path.remove(path)
+
+
+def _find_jit_objects(root):
+    builtins = dict(inspect.getmembers(__builtins__))
+    for module_name, filename in find_sources(root):
+        if is_staticpy_module(filename):
+            yield artifact_id(root, filename, ""), JitObject(module_name.split(".")[-1], filename, builtins)
+            continue
+        with open(filename) as f:
+            source = f.read()
+        if "jit" not in source and "vectorize" not in source:
+            continue
+        module = importlib.import_module(module_name)
+        for name, value in vars(module).items():
+            if not isinstance(value, JitObject) or value._source_path != os.path.abspath(filename):
+                continue
+            if value._generic:
+                logging.warning(f"{module_name}.{name}: skipped, generic functions are compiled when called")
+                continue
+            yield artifact_id(root, filename, value.obj.__qualname__), value
+
+
+def portable_march():
+    """
+    The `-march` target of the libraries built ahead of time, unless another one is
+    given: the baseline of the architecture, rather than the instruction sets of the
+    CPU building them. None where no instruction set is enabled by default.
+    """
+    return {"x86_64": "x86-64", "amd64": "x86-64", "i386": "i686", "i686": "i686"}.get(platform.machine().lower())
+
+
+def build_package(root, workers=None, march=None):
+    """
+    Compile every jit function and `# @staticpy` module under `root` into its
+    `__staticpy__` directory, and write the manifest the runtime loads them from.
+    The libraries target `march`, or the baseline of the architecture.
+
+    Returns the path of the manifest.
+    """
+    root = os.path.abspath(root)
+    output = os.path.join(root, DIRNAME)
+    os.makedirs(output, exist_ok=True)
+    suffix = get_extension_suffix()
+    march = march or portable_march()
+    features = set()
+
+    def build(obj):
+        libname, path = build_library([obj], obj.name)
+        shutil.copyfile(path, os.path.join(output, libname + suffix))
+        compiler = Compiler(extra_flags=obj.extra_flags)
+        features.update(compiler.driver.target_features(compiler.flags()))
+        return libname, libname + suffix
+
+    option = get_option("march")
+    set_option("march", march)
+    try:
+        objs = dict(find_jit_objects(root))
+        with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+            futures = {key: executor.submit(build, obj) for key, obj in objs.items()}
+            libraries = {key: future.result() for key, future in futures.items()}
+    finally:
+        set_option("march", option)
+    built = {filename for _, filename in libraries.values()}
+    for filename in os.listdir(output):
+        # libraries of earlier builds
+        if filename.endswith(suffix) and filename not in built:
+            os.remove(os.path.join(output, filename))
+    return write_manifest(root, libraries, march, sorted(features))
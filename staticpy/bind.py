@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import functools
 import importlib
 from enum import Enum
 import types
@@ -58,8 +59,9 @@ class BindObject(ABC):
 
     def _wrap_function(self, block):
         wrapped_inputs = [(t.ref if isinstance(t, T.ArrayType) else t, n) for (t, n) in block.inputs]
+        returns_array = isinstance(block.output, T.ArrayType)
         # if any, wrap the array types
-        if any(isinstance(type, T.ArrayType) for type, name in block.inputs):
+        if self._needs_wrapper(block):
             wrapped_inputs = []
             params = []
             wrapped_func = B.EmptyBlock()
@@ -72,14 +74,38 @@ class BindObject(ABC):
                         v_in = V.Variable(n, buffer_t)
                         v_out = V.Variable("_" + n, t)
                         buffer_info = V.Variable(f"buffer_info_{n}", auto_t)
-                        S.declare(buffer_info, E.CallFunction(E.GetAttr(v_in, "request"), ()))
+                        if t.mutable:
+                            request = E.CallFunction("request_writable", (v_in, E.Const(n)))
+                        else:
+                            request = E.CallFunction(E.GetAttr(v_in, "request"), ())
+                        S.declare(buffer_info, request)
                         S.declare(v_out, E.CallFunction(t.cname(), (buffer_info, )))
                         params.append(v_out)
                     else:
                         wrapped_inputs.append((t, n))
                         params.append(V.Variable(n, t))
-                S.returns(E.CallFunction(block.name, tuple(params)))
-            wrapped_func = B.Function(block.name, wrapped_inputs, block.output, wrapped_func.statements, block.doc)
+                if block.nogil:
+                    # released after the buffers are requested, and acquired again before
+                    # they are released on return
+                    S.statement("py::gil_scoped_release _release;")
+                result = E.CallFunction(block.name, tuple(params))
+                if block.contiguous_variant is not None:
+                    # dispatch to the variant indexing the arrays without strides
+                    arrays = [param for param in params
+                              if isinstance(param.type, T.ArrayType) and not param.type.is_continuous]
+                    checks = (E.CallFunction(E.GetAttr(array, "is_c_contiguous"), ()) for array in arrays)
+                    contiguous = functools.reduce(E.LogicalAnd, checks)
+                    result = E.IIf(contiguous, E.CallFunction(block.contiguous_variant.name, tuple(params)), result)
+                if returns_array:
+                    if block.nogil:
+                        # numpy needs the GIL to take over the result
+                        S.declare(V.Variable("result", auto_t), result)
+                        S.statement("py::gil_scoped_acquire _acquire;")
+                        result = V.Name("result")
+                    result = E.CallFunction("to_numpy", (result, ))
+                S.returns(result)
+            wrapped_func = B.Function(self._wrapper_name(block), wrapped_inputs, self._wrapped_output(block),
+                                      wrapped_func.statements, block.doc)
             m = M.IfDefMacro("PYBIND")
             m.add_statement(S.BlockStatement(wrapped_func))
             block.parent.add_statement(S.BlockStatement(m))
@@ -88,6 +114,31 @@ class BindObject(ABC):
             inputs = [(t.wrapped(), n) for t, n in block.inputs]
         return inputs
 
+    @staticmethod
+    def _needs_wrapper(block):
+        return isinstance(block.output, T.ArrayType) or any(isinstance(t, T.ArrayType) for t, _ in block.inputs)
+
+    @staticmethod
+    def _wrapper_name(block):
+        return block.name + "__wrapper"
+
+    @staticmethod
+    def _wrapped_output(block):
+        if isinstance(block.output, T.ArrayType):
+            return block.output.returned()
+        return block.output
+
+    @classmethod
+    def _call_guards(cls, block):
+        """
+        Extra arguments of `def` for a function that doesn't release the GIL in its
+        wrapper.
+        """
+        if block.nogil and not cls._needs_wrapper(block):
+            guard = E.TemplateInstantiate(E.ScopeAnalysis("py", "call_guard"), (V.Name("py::gil_scoped_release"), ))
+            return (E.CallFunction(guard, ()), )
+        return ()
+
 
 class PyBindModule(BindObject):
     def __init__(self, name, module):
@@ -102,7 +153,7 @@ class PyBindModule(BindObject):
                     S.assign(V.Name("m.doc()"), self.doc)
                 for stmt in self.obj.statements:
                     if isinstance(stmt, S.BlockStatement):
-                        if isinstance(stmt.block, B.Function):
+                        if isinstance(stmt.block, B.Function) and stmt.block.variant_of is None:
                             PyBindFunction(stmt.block.name, stmt.block).bind(m)
                         elif isinstance(stmt.block, B.Class):
                             PyBindClass(stmt.block.name, stmt.block).bind(m)
@@ -127,15 +178,14 @@ class PyBindFunction(BindObject):
 
     def bind(self, parent, namespace=None):
         inputs = self._wrap_function(self.block)
-        signature = function_pointer_signature(inputs, self.block.output, namespace)
-        args = (self.name, E.Cast(self.address(namespace), V.Name(signature)), self.doc)
+        signature = function_pointer_signature(inputs, self._wrapped_output(self.block), namespace)
+        args = (self.name, E.Cast(self.address(namespace), V.Name(signature)), self.doc) + self._call_guards(self.block)
         S.as_statement(E.CallFunction(E.GetAttr(parent, "def"), args))
 
     def address(self, namespace=None):
+        name = self._wrapper_name(self.block) if self._needs_wrapper(self.block) else self.name
         if namespace:
-            name = E.ScopeAnalysis(V.Name(namespace), V.Name(self.name))
-        else:
-            name = self.name
+            name = E.ScopeAnalysis(V.Name(namespace), V.Name(name))
         return E.AddressOf(V.Name(name))
 
     @property
@@ -146,7 +196,7 @@ class PyBindFunction(BindObject):
 class PyBindMethod(PyBindFunction):
     def bind(self, parent, namespace=None):
         inputs = self._wrap_function(self.block)
-        signature = function_pointer_signature(inputs, self.block.output, namespace if not self.block.static else None)
+        signature = function_pointer_signature(inputs, self._wrapped_output(self.block), namespace if not self.block.static else None)
         args = (self.name, E.Cast(self.address(namespace), V.Name(signature)), self.doc)
         S.as_statement(E.CallFunction(E.GetAttr(parent, "def"), args))
 
@@ -175,7 +225,7 @@ class PyBindOperator(PyBindMethod):
     def bind(self, parent, namespace=None):
         name = self.operators_mapping[self.name.lstrip("operator").strip(" ")]
         inputs = self._wrap_function(self.block)
-        signature = function_pointer_signature(inputs, self.block.output, namespace if not self.block.static else None)
+        signature = function_pointer_signature(inputs, self._wrapped_output(self.block), namespace if not self.block.static else None)
         args = (name, E.Cast(self.address(namespace), V.Name(signature)), E.CallFunction(E.ScopeAnalysis("py", "is_operator"), ()))
         S.as_statement(E.CallFunction(E.GetAttr(parent, "def"), args))
 
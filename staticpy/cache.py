@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def get_version():
+    with open(os.path.join(os.path.dirname(__file__), "VERSION")) as f:
+        return f.read().strip()
+
+
+def default_cache_dir():
+    """
+    The cache of the user, `$XDG_CACHE_HOME/staticpy`, or `~/.cache/staticpy`.
+    """
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "staticpy")
+
+
+def make_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of compiled libraries.
+
+    Every artifact lives in its own directory named after the library and its key,
+    so that libraries built from different sources never overwrite each other. The
+    store can be shared by many processes: builds are serialized with a lock file per
+    artifact and published with an atomic rename, so a reader never sees a partially
+    written library.
+    """
+    key_length = 16
+
+    def __init__(self, root, readonly=False):
+        self.root = root
+        self.readonly = readonly
+
+    def artifact_dir(self, key, libname):
+        return os.path.join(self.root, f"{libname}.{key[:self.key_length]}")
+
+    def artifact_path(self, key, libname, suffix):
+        return os.path.join(self.artifact_dir(key, libname), libname + suffix)
+
+    def lookup(self, key, libname, suffix):
+        path = self.artifact_path(key, libname, suffix)
+        if os.path.exists(path):
+            return path
+        return None
+
+    @contextmanager
+    def lock(self, key, libname):
+        if self.readonly:
+            raise PermissionError(f"artifact cache `{self.root}` is read-only")
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.artifact_dir(key, libname) + ".lock", "w") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def staging(self, key, libname):
+        """
+        Yield a private directory to build the artifact in, and publish it under the
+        artifact directory when the block exits without error.
+        """
+        if self.readonly:
+            raise PermissionError(f"artifact cache `{self.root}` is read-only")
+        os.makedirs(self.root, exist_ok=True)
+        target = self.artifact_dir(key, libname)
+        staging = tempfile.mkdtemp(prefix=os.path.basename(target) + ".tmp-", dir=self.root)
+        try:
+            yield staging
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.publish(staging, target)
+
+    @staticmethod
+    def publish(staging, target):
+        if os.path.exists(target):
+            outdated = tempfile.mkdtemp(prefix=os.path.basename(target) + ".old-", dir=os.path.dirname(target))
+            os.rename(target, os.path.join(outdated, "artifact"))
+            os.rename(staging, target)
+            shutil.rmtree(outdated, ignore_errors=True)
+        else:
+            os.rename(staging, target)
@@ -1,6 +1,10 @@
+import os
+
 _options = {
     "cpp_std": "c++11",
     "optimize": "3",
+    "cache_dir": os.environ.get("STATICPY_CACHE_DIR"),
+    "cache_readonly": os.environ.get("STATICPY_CACHE_READONLY", "") not in ("", "0"),
 }
 
 
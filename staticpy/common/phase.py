@@ -1,26 +1,28 @@
 import abc
 from contextlib import contextmanager
 import inspect
+import threading
 import typing
 
 from ..lang.common.func import get_session
 from ..lang import expression as E, variable as V, macro as M
 
-__building = 0
+# the building phase is tracked per thread, so that functions can be translated in
+# background threads while the main thread keeps calling compiled ones
+_state = threading.local()
 
 
 def is_building():
-    return __building
+    return getattr(_state, "building", 0)
 
 
 @contextmanager
 def set_building():
-    global __building
-    __building += 1
+    _state.building = is_building() + 1
     try:
         yield
     finally:
-        __building -= 1
+        _state.building -= 1
 
 
 class TwoPhaseFunction(abc.ABC):
@@ -40,14 +42,35 @@ class TwoPhaseFunction(abc.ABC):
 
 
 class LibFunction(TwoPhaseFunction):
-    def __init__(self, header, pyfunction, function, namespace=None):
+    """
+    A function of a C++ library, and its Python counterpart.
+
+    `signatures` maps the types of the arguments of the overloads of the function to
+    the types of their results, such as `{(T.Float, ): T.Float}`, so that calls are
+    typed. Arguments are looked up by their promoted types: `bool`, `char` and `short`
+    as `int`. Calls matching no signature are untyped.
+    """
+    def __init__(self, header, pyfunction, function, namespace=None, signatures=None):
         self.header = header
         self.function = V.Name(function) if isinstance(function, str) else function
         self.pyfunction = pyfunction
         self.namespace = namespace
+        self.signatures = signatures or {}
         if not (hasattr(function, "__call__") or isinstance(function, str)):
             raise TypeError(f"unknown type {type(self.function)}")
 
+    def return_type(self, args):
+        """
+        The type of the result of a call with the expressions `args`, or None if no
+        signature matches.
+        """
+        types = tuple(E.promoted_type(E.operand_type(arg)) for arg in args)
+        try:
+            return self.signatures.get(types)
+        except TypeError:
+            # unhashable types
+            return None
+
     def normal(self, *args, **kwargs):
         return self.pyfunction(*args, **kwargs)
 
@@ -59,12 +82,13 @@ class LibFunction(TwoPhaseFunction):
             function = E.ScopeAnalysis(self.namespace, self.function) if self.namespace else self.function
             if kwargs:
                 raise ValueError("kwargs is invalid for cpp call")
-            return E.CallFunction(function, args)
+            args = tuple(map(E.cast_value_to_expression, args))
+            return E.CallFunction(function, args, self.return_type(args))
 
     def __getitem__(self, *args):
-        if not callable(self.function):
+        if isinstance(self.function, V.Value):
             function = E.TemplateInstantiate(self.function, args)
-            return LibFunction(self.header, self.pyfunction, function, self.namespace)
+            return LibFunction(self.header, self.pyfunction, function, self.namespace, self.signatures)
         else:
             raise NotImplementedError
 
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+from .options import get_option
+
+# the build of the current thread
+_local = threading.local()
+_lock = threading.Lock()
+_reports = []
+_callbacks = []
+
+
+class BuildProfile:
+    """
+    How long each phase of the build of a library took.
+
+    `phases` lists (phase, function, seconds) in the order the phases ended. Phases
+    may be nested: compiling includes looking up the include path, and translating
+    a function includes translating the functions it calls.
+    """
+    def __init__(self, libname, functions):
+        self.libname = libname
+        self.functions = functions
+        self.phases = []
+        self.seconds = None
+
+    def totals(self):
+        """
+        {phase: seconds} summed over the functions.
+        """
+        totals = {}
+        for name, _, seconds in self.phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def to_dict(self):
+        return {
+            "library": self.libname,
+            "functions": self.functions,
+            "seconds": self.seconds,
+            "phases": [{"phase": name, "function": function, "seconds": seconds}
+                       for name, function, seconds in self.phases],
+            "totals": self.totals(),
+        }
+
+
+@contextmanager
+def profile_build(libname, functions):
+    """
+    Record the phases of a build within the block, if the `profile` option is on.
+
+    The profile is kept in `reports()` and passed to the callbacks. With the
+    `profile_json` option set to a path, all the reports are written to it as JSON.
+    """
+    if not get_option("profile", False) or getattr(_local, "current", None) is not None:
+        yield None
+        return
+    report = _local.current = BuildProfile(libname, functions)
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        _local.current = None
+        report.seconds = time.perf_counter() - start
+    with _lock:
+        _reports.append(report)
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        callback(report)
+    path = get_option("profile_json")
+    if path:
+        dump(path)
+
+
+@contextmanager
+def phase(name, function=None):
+    """
+    Record the duration of the block as the phase `name` of the current build.
+    """
+    report = getattr(_local, "current", None)
+    if report is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        report.phases.append((name, function, time.perf_counter() - start))
+
+
+def reports():
+    with _lock:
+        return list(_reports)
+
+
+def clear():
+    with _lock:
+        _reports.clear()
+
+
+def add_callback(callback):
+    """
+    Call `callback` with the `BuildProfile` of every build that ends.
+    """
+    with _lock:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    with _lock:
+        _callbacks.remove(callback)
+
+
+def dump(path):
+    with open(path, "w") as f:
+        json.dump([report.to_dict() for report in reports()], f, indent=2)
@@ -1,10 +1,13 @@
 import os
 
 
+def get_extension_suffix():
+    from ..toolchain import get_toolchain
+    return get_toolchain().ext_suffix
+
+
 def get_target_filepath(path, libname):
-    with os.popen("python3-config --extension-suffix") as f:
-        suffix = f.read().strip("\n")
-    return os.path.join(path, libname + suffix)
+    return os.path.join(path, libname + get_extension_suffix())
 
 
 def function_pointer_signature(inputs, output, namespace):
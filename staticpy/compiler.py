@@ -1,62 +1,286 @@
+import atexit
 import os
 import sys
 import shutil
 import platform
+import tempfile
 
 import jinja2
 
+from .cache import ArtifactCache, default_cache_dir, file_digest, get_version, make_key
+from .driver import CompileError, get_driver, native_features
 from .session import new_session
-from .common.string import get_target_filepath
+from .common.string import get_extension_suffix, get_target_filepath
 from .common.options import get_option
+from .common.profile import phase
+from .toolchain import get_toolchain
 from .common import logging
 from .lang import macro as M, statement as S, block as B
 
 from .lang.common import get_block_or_create
 
+# {cache key: library this process built outside of a read-only cache}
+_private_builds = {}
+
 
 class Compiler:
-    def __init__(self):
+    # headers included by every generated library, compiled once into a precompiled header
+    prelude = """#define PYBIND
+#include <pybind11/pybind11.h>
+#include <array.h>
+"""
+    prelude_name = "staticpy_prelude"
+
+    def __init__(self, driver=None, extra_flags=()):
         self.templates = []
+        self.driver = driver or get_driver()
+        self.extra_flags = list(extra_flags)
 
     def add_template(self, suffix, template):
         self.templates.append((suffix, template))
 
-    @staticmethod
-    def ensure_build_path(target_path):
-        build_path = os.path.join(target_path, "build")
-        if not os.path.exists(build_path):
-            os.makedirs(build_path)
-        return build_path
-
-    def run(self, session, target_path, libname):
-        build_path = self.ensure_build_path(target_path)
-        libname = libname
+    def render(self, session):
         sources = []
-        with session:
+        with phase("render"), session:
             for suffix, template in self.templates:
-                target_filename = os.path.join(build_path, libname + suffix)
-                source = template.render(session)
-                with open(target_filename, "w") as f:
-                    f.write(source)
-                sources.append(target_filename)
-        self.compile(target_path, libname, sources)
-
-    def compile(self, target_path, libname, sources):
-        sources = " ".join(sources)
-        includes = get_include_path()
-        output_filename = get_target_filepath(target_path, libname)
+                sources.append((suffix, template.render(session)))
+        return sources
+
+    def cache_key(self, sources, flags=()):
+        """
+        The key identifies a build on any host with the same compiler and ABI, so it
+        contains no host-specific paths.
+        """
+        with phase("cache_key"):
+            return self._cache_key(sources, flags)
+
+    def _cache_key(self, sources, flags):
+        return make_key(
+            get_version(),
+            get_option('cpp_std'),
+            get_option('optimize'),
+            get_option('build_mode', 'release'),
+            self.driver.version(),
+            self.flags() + list(flags),
+            native_features(self.flags() + list(flags)),
+            get_extension_suffix(),
+            platform.machine(),
+            get_pybind11_version(),
+            get_headers_digest(),
+            *(source for _, source in sources),
+        )
+
+    @staticmethod
+    def get_cache():
+        root = get_option("cache_dir") or default_cache_dir()
+        return ArtifactCache(root, readonly=get_option("cache_readonly", False))
+
+    def run(self, session, libname):
+        """
+        Render the templates and compile them into a library, unless a library built
+        from exactly the same sources and flags already exists.
+
+        Returns the path of the library.
+        """
+        cache = self.get_cache()
+        sources = self.render(session)
+        flags = self.session_flags(session)
+        key = self.cache_key(sources, flags)
+        suffix = get_extension_suffix()
+        force = get_option("force_compile", False)
+        output_filename = cache.lookup(key, libname, suffix)
+        if output_filename is not None and not force:
+            logging.debug(f"{libname}: reuse {output_filename}")
+            return output_filename
+        if cache.readonly:
+            logging.warning(f"{libname}: not found in read-only cache `{cache.root}`, building privately")
+            return self.build_privately(key, libname, sources, flags)
+        pch_flags = self.precompiled_header(cache) + flags
+        with cache.lock(key, libname):
+            # another process may have published the library while we were waiting
+            output_filename = cache.lookup(key, libname, suffix)
+            if output_filename is not None and not force:
+                return output_filename
+            with cache.staging(key, libname) as staging:
+                self.build(staging, libname, sources, pch_flags)
+        return cache.artifact_path(key, libname, suffix)
+
+    def run_profiled(self, session, instrumented_session, libname, train):
+        """
+        Build a library optimised with profile data, in two stages:
+
+        1. `instrumented_session` is compiled with instrumentation, and `train` is
+           called with the path of the instrumented library. It must load the library,
+           exercise it and make it write its profile.
+        2. `session` is compiled again using the profile and link-time optimisation.
+
+        The profile is kept in the artifact cache next to the library, so that it's
+        recorded only once for the same sources.
+
+        Returns the path of the optimised library.
+        """
+        cache = self.get_cache()
+        sources = self.render(session)
+        flags = self.session_flags(session)
+        key = self.cache_key(sources, flags)
+        suffix = get_extension_suffix()
+        force = get_option("force_compile", False)
+        output_filename = cache.lookup(key, libname, suffix)
+        if output_filename is not None and not force:
+            return output_filename
+        if cache.readonly:
+            logging.warning(f"{libname}: not found in read-only cache `{cache.root}`, building privately without profile")
+            return self.build_privately(key, libname, sources, flags)
+        with cache.lock(key, libname):
+            output_filename = cache.lookup(key, libname, suffix)
+            if output_filename is not None and not force:
+                return output_filename
+            # gcc names the profile after the object file, so both stages are compiled
+            # to the same object in a directory that doesn't move
+            profile_dir = cache.artifact_dir(key, libname) + ".profile"
+            workdir = os.path.join(profile_dir, "work")
+            complete = os.path.join(profile_dir, "complete")
+            if force or not os.path.exists(complete):
+                shutil.rmtree(profile_dir, ignore_errors=True)
+                os.makedirs(workdir)
+                instrumented = self.render(instrumented_session)
+                instrumented_filename = get_target_filepath(workdir, "instrumented")
+                self.compile_object(workdir, instrumented, instrumented_filename,
+                                    flags + self.driver.profile_generate_flags(profile_dir))
+                train(instrumented_filename)
+                with open(complete, "w"):
+                    pass
+            with cache.staging(key, libname) as staging:
+                for ext, source in sources:
+                    with open(os.path.join(staging, libname + ext), "w") as f:
+                        f.write(source)
+                self.compile_object(workdir, sources, get_target_filepath(staging, libname),
+                                    flags + self.driver.profile_use_flags(profile_dir))
+        return cache.artifact_path(key, libname, suffix)
+
+    def session_flags(self, session):
+        """
+        Flags required by the generated code, such as OpenMP for parallel loops.
+        """
+        flags = []
+        if session.openmp and get_option("openmp", True):
+            flags += self.driver.openmp_flags()
+        return flags
+
+    def compile_object(self, workdir, sources, output_filename, flags):
+        """
+        Compile and link in two steps through a fixed object file in `workdir`.
+        """
+        filenames = []
+        for suffix, source in sources:
+            filename = os.path.join(workdir, "profiled" + suffix)
+            with open(filename, "w") as f:
+                f.write(source)
+            filenames.append(filename)
+        obj = os.path.join(workdir, "profiled.o")
+        self.driver.run(self.driver.command(self.flags() + get_include_path() + flags + ["-c"], filenames, obj))
+        self.driver.run(self.driver.command(self.flags() + flags, [obj], output_filename))
+        return output_filename
+
+    def precompiled_header(self, cache):
+        """
+        Build the precompiled prelude if it's not in the cache yet, and return the
+        flags to use it. The header is keyed on the compiler, the flags and the
+        versions of pybind11 and StaticPy.
+        """
+        if not get_option("precompiled_header", True):
+            return []
+        with phase("precompiled_header"):
+            return self._precompiled_header(cache)
+
+    def _precompiled_header(self, cache):
+        suffix = self.driver.pch_suffix
+        key = make_key(
+            get_version(),
+            self.driver.version(),
+            self.flags(),
+            native_features(self.flags()),
+            get_extension_suffix(),
+            get_pybind11_version(),
+            get_headers_digest(),
+            self.prelude,
+        )
+        name = self.prelude_name
+        pch = cache.lookup(key, name, suffix)
+        if pch is None:
+            with cache.lock(key, name):
+                pch = cache.lookup(key, name, suffix)
+                if pch is None:
+                    try:
+                        with cache.staging(key, name) as staging:
+                            self.build_precompiled_header(staging, suffix)
+                    except CompileError as e:
+                        logging.warning(f"failed to build the precompiled header, compiling without it\n{e}")
+                        return []
+                    pch = cache.artifact_path(key, name, suffix)
+        header = pch[:-len(suffix)] + ".h"
+        return self.driver.pch_flags(header, pch)
+
+    def build_precompiled_header(self, path, suffix):
+        header = os.path.join(path, self.prelude_name + ".h")
+        with open(header, "w") as f:
+            f.write(self.prelude)
+        output_filename = os.path.join(path, self.prelude_name + suffix)
+        flags = self.flags() + get_include_path() + ["-x", "c++-header"]
+        self.driver.run(self.driver.command(flags, [header], output_filename))
+        return output_filename
+
+    def build_privately(self, key, libname, sources, flags):
+        """
+        Build a library missing from a read-only cache into a temporary directory,
+        removed when the process exits. It's built once per process for the same key.
+        """
+        if key in _private_builds and not get_option("force_compile", False):
+            return _private_builds[key]
+        path = tempfile.mkdtemp(prefix="staticpy-")
+        atexit.register(shutil.rmtree, path, True)
+        _private_builds[key] = self.build(path, libname, sources, flags)
+        return _private_builds[key]
+
+    def build(self, path, libname, sources, flags=()):
+        filenames = []
+        for suffix, source in sources:
+            target_filename = os.path.join(path, libname + suffix)
+            with open(target_filename, "w") as f:
+                f.write(source)
+            filenames.append(target_filename)
+        return self.compile(path, libname, filenames, flags)
+
+    def flags(self):
         cpp_std = get_option('cpp_std')
         optimize_level = get_option('optimize')
-        command = f"c++ -O{optimize_level} -mavx2 -Wall -shared -std={cpp_std} -fPIC {includes} {sources} -o {output_filename}"
-        if platform.system() == "Darwin":
-            command += " -undefined dynamic_lookup"
-        logging.info(command)
-        os.system(command)
+        flags = [f"-O{optimize_level}", "-Wall", f"-std={cpp_std}"]
+        flags += self.driver.arch_flags()
+        if get_option("build_mode", "release") in ("lto", "pgo"):
+            flags += self.driver.lto_flags()
+        flags += self.driver.shared_flags()
+        flags += self.extra_flags
+        return flags
+
+    def compile(self, target_path, libname, sources, flags=()):
+        output_filename = get_target_filepath(target_path, libname)
+        flags = self.flags() + get_include_path() + list(flags)
+        self.driver.run(self.driver.command(flags, sources, output_filename))
+        return output_filename
+
+
+def get_pybind11_version():
+    return get_toolchain().pybind11_version
+
+
+def get_header_path():
+    return os.path.join(os.path.dirname(__file__), "cpp", "header")
+
+
+def get_headers_digest():
+    path = get_header_path()
+    return make_key(*(file_digest(os.path.join(path, name)) for name in sorted(os.listdir(path))))
 
 
 def get_include_path():
-    with os.popen("python3 -m pybind11 --includes") as f:
-        includes = f.read().strip("\n")
-    path = os.path.dirname(__file__)
-    includes += " -I" + os.path.join(path, "cpp", "header")
-    return includes
+    return get_toolchain().include_flags() + ["-I" + get_header_path()]
@@ -1,27 +1,129 @@
 #pragma once
 #include <vector>
+#include <memory>
+#include <string>
+#include <type_traits>
 #include <stdarg.h>
 #include <stdexcept>
 #ifdef PYBIND
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 namespace py = pybind11;
 #endif
 
+// `T` is const for read-only arrays
 template <typename T, long ndim>
 class Array {
 public:
-    const T *data;
-    const std::vector<long>& shape;
-    const std::vector<long>& strides;
-    const long dim = ndim;
-    const long itemsize;
+    typedef typename std::remove_const<T>::type value_type;
+    T *data;
+    long shape[ndim];
+    long strides[ndim];
+    // strides in elements rather than in bytes
+    long estrides[ndim];
+    static constexpr long dim = ndim;
+    long itemsize;
+    // the memory of arrays created by `empty`, shared by the copies of the array
+    std::shared_ptr<T> owner;
     #ifdef PYBIND
-    Array(py::buffer_info& bi) : 
-        data((T*)bi.ptr), shape(bi.shape), strides(bi.strides), itemsize(bi.itemsize) {
+    Array(py::buffer_info& bi) :
+        data((T*)bi.ptr), itemsize(bi.itemsize) {
+        if (bi.ndim != ndim) {
+            throw std::invalid_argument("expected an array of " + std::to_string(ndim) + " dimensions, got " + std::to_string(bi.ndim));
+        }
+        for (long i = 0; i < ndim; ++i) {
+            shape[i] = bi.shape[i];
+            strides[i] = bi.strides[i];
+        }
+        init_estrides();
     }
     #endif
-    Array(const T* data, const std::vector<long>& shape, const std::vector<long>& strides, long itemsize) : 
-        data(data), shape(shape), strides(strides), itemsize(itemsize) {
+    Array(T* data, const long* shape, const long* strides, long itemsize) :
+        data(data), itemsize(itemsize) {
+        for (long i = 0; i < ndim; ++i) {
+            this->shape[i] = shape[i];
+            this->strides[i] = strides[i];
+        }
+        init_estrides();
     }
 
+    // a read-only view of a writable array
+    template <typename U, typename = typename std::enable_if<std::is_same<const U, T>::value>::type>
+    Array(const Array<U, ndim>& other) :
+        data(other.data), itemsize(other.itemsize), owner(other.owner) {
+        for (long i = 0; i < ndim; ++i) {
+            shape[i] = other.shape[i];
+            strides[i] = other.strides[i];
+            estrides[i] = other.estrides[i];
+        }
+    }
+
+    // a new C-contiguous array with uninitialized elements
+    template <typename... Sizes>
+    static Array empty(Sizes... sizes) {
+        static_assert(sizeof...(sizes) == ndim, "the number of sizes must equal the number of dimensions");
+        long shape[ndim] = {(long)sizes...};
+        long strides[ndim];
+        long size = 1;
+        for (long i = ndim - 1; i >= 0; --i) {
+            strides[i] = size * sizeof(T);
+            size *= shape[i];
+        }
+        std::shared_ptr<T> owner(new value_type[size > 0 ? size : 1], std::default_delete<value_type[]>());
+        Array array(owner.get(), shape, strides, sizeof(T));
+        array.owner = owner;
+        return array;
+    }
+
+    // whether the elements are laid out in row-major order without gaps
+    bool is_c_contiguous() const {
+        long stride = 1;
+        for (long i = ndim - 1; i >= 0; --i) {
+            if (shape[i] != 1 && estrides[i] != stride) {
+                return false;
+            }
+            stride *= shape[i];
+        }
+        return true;
+    }
+
+private:
+    void init_estrides() {
+        for (long i = 0; i < ndim; ++i) {
+            if (strides[i] % itemsize != 0) {
+                throw std::invalid_argument("array strides must be multiples of the item size");
+            }
+            estrides[i] = strides[i] / itemsize;
+        }
+    }
 };
+
+#ifdef PYBIND
+// Request the buffer of an array parameter written to by the function.
+inline py::buffer_info request_writable(const py::buffer& buffer, const char* name) {
+    try {
+        return buffer.request(true);
+    } catch (py::error_already_set& e) {
+        if (!e.matches(PyExc_ValueError) && !e.matches(PyExc_BufferError)) {
+            throw;
+        }
+        throw py::value_error(std::string("argument `") + name + "` must be a writable array: " + e.what());
+    }
+}
+
+// Convert an array returned to Python. The memory of an array created by `empty` is
+// handed over to numpy without copy, and any other array is copied.
+template <typename T, long ndim>
+py::array_t<typename Array<T, ndim>::value_type> to_numpy(const Array<T, ndim>& array) {
+    typedef typename Array<T, ndim>::value_type V;
+    std::vector<long> shape(array.shape, array.shape + ndim);
+    std::vector<long> strides(array.strides, array.strides + ndim);
+    V* data = const_cast<V*>(array.data);
+    if (!array.owner) {
+        return py::array_t<V>(shape, strides, data);
+    }
+    auto owner = new std::shared_ptr<T>(array.owner);
+    py::capsule base(owner, [](void* p) { delete (std::shared_ptr<T>*)p; });
+    return py::array_t<V>(shape, strides, data, base);
+}
+#endif
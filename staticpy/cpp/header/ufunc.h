@@ -0,0 +1,75 @@
+#pragma once
+#include <vector>
+#include <initializer_list>
+#include <stdexcept>
+#include <pybind11/pybind11.h>
+namespace py = pybind11;
+
+// Walks over buffers of the same shape one row at a time, a row being the last
+// dimension. After each call to `next`, `data[k]` points to the start of the
+// current row of the k-th buffer and `strides[k]` is its stride along the row.
+class StridedLoop {
+public:
+    std::vector<char*> data;
+    std::vector<long> strides;
+    long size;
+
+    StridedLoop(std::initializer_list<py::buffer_info*> buffers) : size(1), ndim(0), rows(1), row(0) {
+        const py::buffer_info* first = *buffers.begin();
+        ndim = first->ndim;
+        shape = std::vector<long>(first->shape.begin(), first->shape.end());
+        for (const py::buffer_info* bi : buffers) {
+            if (bi->ndim != ndim || std::vector<long>(bi->shape.begin(), bi->shape.end()) != shape) {
+                throw std::invalid_argument("buffers have different shapes");
+            }
+            data.push_back((char*)bi->ptr);
+            strides.push_back(ndim ? bi->strides[ndim - 1] : 0);
+            outer_strides.push_back(std::vector<long>(bi->strides.begin(), bi->strides.end()));
+        }
+        if (ndim) {
+            size = shape[ndim - 1];
+        }
+        for (long d = 0; d < ndim - 1; ++d) {
+            rows *= shape[d];
+        }
+        if (size == 0) {
+            rows = 0;
+        }
+        index = std::vector<long>(ndim > 1 ? ndim - 1 : 0, 0);
+    }
+
+    bool next() {
+        if (row == rows) {
+            return false;
+        }
+        if (row > 0) {
+            advance();
+        }
+        ++row;
+        return true;
+    }
+
+private:
+    long ndim;
+    long rows;
+    long row;
+    std::vector<long> shape;
+    std::vector<long> index;
+    std::vector<std::vector<long>> outer_strides;
+
+    void advance() {
+        for (long d = ndim - 2; d >= 0; --d) {
+            ++index[d];
+            for (size_t k = 0; k < data.size(); ++k) {
+                data[k] += outer_strides[k][d];
+            }
+            if (index[d] < shape[d]) {
+                return;
+            }
+            for (size_t k = 0; k < data.size(); ++k) {
+                data[k] -= outer_strides[k][d] * shape[d];
+            }
+            index[d] = 0;
+        }
+    }
+};
@@ -0,0 +1,231 @@
+from abc import ABC, abstractmethod
+import os
+import platform
+import shlex
+import subprocess
+
+from .common import logging
+from .common.options import get_option
+from .common.profile import phase
+from .toolchain import compiler_version
+
+
+class CompileError(RuntimeError):
+    def __init__(self, command, stderr):
+        self.command = command
+        self.stderr = stderr
+        super().__init__(f"command failed: {' '.join(command)}\n{stderr}")
+
+
+class CompilerDriver(ABC):
+    """
+    Knows how to invoke one family of C++ compilers.
+
+    `executable` is the compiler to run, and `launcher` is an optional prefix such as
+    `ccache` or `sccache` that the compiler is run through.
+    """
+    pch_suffix = None
+
+    def __init__(self, executable="c++", launcher=None):
+        self.executable = executable
+        self.launcher = shlex.split(launcher) if isinstance(launcher, str) else list(launcher or [])
+        self._version = None
+
+    def version(self):
+        if self._version is None:
+            self._version = compiler_version(
+                self.executable, lambda: self.run([self.executable, "--version"], log=False).strip("\n"))
+        return self._version
+
+    def command(self, flags, sources, output):
+        return self.launcher + [self.executable] + list(flags) + list(sources) + ["-o", output]
+
+    def shared_flags(self):
+        flags = ["-shared", "-fPIC"]
+        if platform.system() == "Darwin":
+            flags += ["-undefined", "dynamic_lookup"]
+        return flags
+
+    def arch_flags(self):
+        march = get_option("march")
+        if march:
+            return [f"-march={march}"]
+        return [flag for feature, flag in self.feature_flags if feature in get_cpu_features()]
+
+    feature_flags = [
+        ("sse4_1", "-msse4.1"),
+        ("sse4_2", "-msse4.2"),
+        ("popcnt", "-mpopcnt"),
+        ("avx", "-mavx"),
+        ("avx2", "-mavx2"),
+        ("fma", "-mfma"),
+        ("bmi2", "-mbmi2"),
+        ("avx512f", "-mavx512f"),
+        ("avx512dq", "-mavx512dq"),
+        ("avx512bw", "-mavx512bw"),
+        ("avx512vl", "-mavx512vl"),
+    ]
+
+    def target_features(self, flags):
+        """
+        The features among `feature_flags` the code compiled with `flags` requires of
+        the CPU, read from the macros the compiler predefines.
+        """
+        output = self.run([self.executable] + list(flags) + ["-dM", "-E", "-x", "c++", os.devnull], log=False)
+        macros = {line.split()[1] for line in output.splitlines() if line.startswith("#define ")}
+        return [feature for feature, _ in self.feature_flags if f"__{feature.upper()}__" in macros]
+
+    def lto_flags(self):
+        return ["-flto"]
+
+    def openmp_flags(self):
+        return ["-fopenmp"]
+
+    @abstractmethod
+    def pch_flags(self, header, pch):
+        pass
+
+    @abstractmethod
+    def profile_generate_flags(self, profile_dir):
+        pass
+
+    @abstractmethod
+    def profile_use_flags(self, profile_dir):
+        pass
+
+    @abstractmethod
+    def profile_dump_function(self):
+        """
+        The C declaration and the name of the function that writes the profile of an
+        instrumented library to disk. It must write the profile once: the library stays
+        loaded, and writing it again at exit would rewrite the profile after the
+        optimised build used it.
+        """
+
+    def environment(self):
+        env = os.environ.copy()
+        if self.launcher and os.path.basename(self.launcher[0]) == "ccache":
+            # ccache refuses to cache compilations using a precompiled header otherwise
+            env.setdefault("CCACHE_SLOPPINESS", "pch_defines,time_macros,include_file_mtime,include_file_ctime")
+        return env
+
+    def run(self, command, log=True):
+        if log:
+            logging.info(" ".join(command))
+        with phase("compiler"):
+            proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  universal_newlines=True, env=self.environment())
+        if proc.returncode != 0:
+            raise CompileError(command, proc.stderr)
+        if proc.stderr:
+            logging.warning(proc.stderr)
+        return proc.stdout
+
+
+class GccDriver(CompilerDriver):
+    pch_suffix = ".h.gch"
+
+    def lto_flags(self):
+        # a single partition, the translation units are small
+        return ["-flto", "-flto-partition=one"]
+
+    def pch_flags(self, header, pch):
+        return ["-include", header, "-Winvalid-pch"]
+
+    def profile_generate_flags(self, profile_dir):
+        return [f"-fprofile-generate={profile_dir}"]
+
+    def profile_use_flags(self, profile_dir):
+        # the instrumented library differs from the optimised one in its module name
+        # and the function dumping the profile, which must not fail the build
+        return [f"-fprofile-use={profile_dir}", "-fprofile-correction", "-Wno-coverage-mismatch", "-Wno-missing-profile"]
+
+    def profile_dump_function(self):
+        # skips the writes that follow, such as at exit, unless the counters are reset
+        return 'extern "C" void __gcov_dump(void);', "__gcov_dump"
+
+
+class ClangDriver(CompilerDriver):
+    pch_suffix = ".h.pch"
+
+    def pch_flags(self, header, pch):
+        return ["-include", header, "-include-pch", pch]
+
+    def openmp_flags(self):
+        if platform.system() == "Darwin":
+            # Apple clang has no driver support for OpenMP, the runtime comes from libomp
+            return ["-Xpreprocessor", "-fopenmp", "-lomp"]
+        return ["-fopenmp"]
+
+    def profile_generate_flags(self, profile_dir):
+        return [f"-fprofile-generate={profile_dir}"]
+
+    def profile_use_flags(self, profile_dir):
+        profdata = os.path.join(profile_dir, "default.profdata")
+        if not os.path.exists(profdata):
+            raw = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir) if name.endswith(".profraw")]
+            self.run([get_option("llvm_profdata") or "llvm-profdata", "merge", "-o", profdata] + raw)
+        return [f"-fprofile-use={profdata}", "-Wno-profile-instr-unprofiled", "-Wno-profile-instr-out-of-date"]
+
+    def profile_dump_function(self):
+        # unlike __llvm_profile_write_file, skips the writes that follow, such as at exit
+        return 'extern "C" int __llvm_profile_dump(void);', "__llvm_profile_dump"
+
+
+_drivers = {}
+
+
+def get_driver():
+    """
+    The driver for the compiler in the `compiler` option (or `$CXX`, or `c++`), run
+    through the launcher in the `compiler_launcher` option.
+    """
+    executable = get_option("compiler") or os.environ.get("CXX") or "c++"
+    launcher = get_option("compiler_launcher")
+    key = (executable, str(launcher))
+    if key not in _drivers:
+        driver = GccDriver(executable, launcher)
+        if "clang" in driver.version():
+            driver = ClangDriver(executable, launcher)
+        _drivers[key] = driver
+    return _drivers[key]
+
+
+_cpu_features = None
+
+
+def get_cpu_features():
+    global _cpu_features
+    if _cpu_features is None:
+        _cpu_features = _detect_cpu_features()
+    return _cpu_features
+
+
+def native_features(flags):
+    """
+    The features of the CPU when `flags` target it with `-march=native` or alike,
+    which stand for different instruction sets on different machines.
+    """
+    if any(flag.startswith(("-march=", "-mcpu=", "-mtune=")) and flag.endswith("=native") for flag in flags):
+        return sorted(get_cpu_features())
+    return []
+
+
+def _detect_cpu_features():
+    if platform.system() == "Linux":
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    # "Features" on ARM
+                    if line.startswith(("flags", "Features")):
+                        return frozenset(line.split(":", 1)[1].split())
+        except OSError:
+            pass
+    elif platform.system() == "Darwin" and platform.machine().lower() in ("x86_64", "amd64", "i386", "i686"):
+        try:
+            output = subprocess.run(["sysctl", "-n", "machdep.cpu.features", "machdep.cpu.leaf7_features"],
+                                    stdout=subprocess.PIPE, universal_newlines=True).stdout
+            return frozenset(x.lower().replace(".", "_") for x in output.split())
+        except OSError:
+            pass
+    return frozenset()
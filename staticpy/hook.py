@@ -4,40 +4,141 @@ from importlib.util import spec_from_file_location, module_from_spec
 import inspect
 import os
 import sys
+import threading
+from types import ModuleType
 
 from .common.options import get_option
 from .jit import JitObject
+from .pool import submit
+from .prebuilt import is_staticpy_module
 
 
 class StaticPyFinder(MetaPathFinder):
+    """
+    Finds the modules marked with `# @staticpy`.
+
+    Like `FileFinder`, it keeps the listing of each directory it searched, refreshed
+    when the modification time of the directory changes, and remembers whether each
+    candidate file is marked, refreshed when the file changes. Most imports are thus
+    answered without reading any file.
+    """
+    # imports that are never StaticPy modules
+    skipped = frozenset(sys.builtin_module_names) | frozenset(getattr(sys, "stdlib_module_names", ()))
+
+    def __init__(self):
+        # {directory: (mtime, names of the entries)}
+        self._listings = {}
+        # {filename: (mtime, whether it's marked)}
+        self._headers = {}
+
     def find_spec(self, fullname, path, target=None):
-        name = fullname.split(".")[-1] + ".py"
-        paths = path or sys.path
-        for path in paths:
-            filename = os.path.join(path, name)
-            if os.path.exists(filename):
-                with open(filename) as f:
-                    line = f.readline()
-                    if line[:2] == "#!":
-                        line = f.readline()
-                if line == "# @staticpy\n":
+        if path is None and fullname in self.skipped:
+            return None
+        stem = fullname.rpartition(".")[2]
+        name = stem + ".py"
+        for directory in path or sys.path:
+            listing = self._listing(directory)
+            if stem in listing and os.path.isfile(os.path.join(directory, stem, "__init__.py")):
+                # a package, which takes precedence over modules in later directories
+                return None
+            if name in listing:
+                filename = os.path.join(directory, name)
+                if self._is_marked(filename):
                     return ModuleSpec(fullname, StaticPyLoader(), origin=filename)
+                return None
+        return None
+
+    def invalidate_caches(self):
+        self._listings.clear()
+        self._headers.clear()
+
+    def _listing(self, directory):
+        directory = directory or "."
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except (OSError, TypeError, ValueError):
+            return frozenset()
+        cached = self._listings.get(directory)
+        if cached is None or cached[0] != mtime:
+            try:
+                names = frozenset(os.listdir(directory))
+            except OSError:
+                names = frozenset()
+            cached = self._listings[directory] = (mtime, names)
+        return cached[1]
+
+    def _is_marked(self, filename):
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except OSError:
+            return False
+        cached = self._headers.get(filename)
+        if cached is None or cached[0] != mtime:
+            cached = self._headers[filename] = (mtime, is_staticpy_module(filename))
+        return cached[1]
 
 
 class StaticPyLoader(Loader):
     def create_module(self, spec):
         name = spec.name.split(".")[-1]
         jit = JitObject(name, spec.origin, dict(inspect.getmembers(__builtins__)))
-        if get_option("force_compile", False) or jit._need_update():
-            jit.compile()
-        self.wrapped_spec = spec_from_file_location(name, jit._target_path)
+        if get_option("lazy_import", False):
+            return LazyModule(spec.name, jit)
+        jit.compile()
+        self.wrapped_spec = spec_from_file_location(jit._libname, jit._target_path)
         module = module_from_spec(self.wrapped_spec)
         return module
 
     def exec_module(self, module):
+        if isinstance(module, LazyModule):
+            if get_option("lazy_import_warmup", False):
+                module._warm_up()
+            return
         self.wrapped_spec.loader.exec_module(module)
 
 
+class LazyModule(ModuleType):
+    """
+    A `# @staticpy` module imported with the `lazy_import` option.
+
+    The module is compiled, or loaded from the cache, the first time one of its
+    attributes is accessed. The attributes of the library are then copied into the
+    module, so later accesses are plain lookups.
+    """
+    def __init__(self, name, jit):
+        super().__init__(name)
+        # mangled, so as not to clash with the attributes of the library
+        self.__jit = jit
+        self.__loaded = False
+        self.__lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # dunder attributes are probed by the import system
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        self.__load()
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(f"module '{self.__name__}' has no attribute '{name}'") from None
+
+    def __load(self):
+        with self.__lock:
+            if self.__loaded:
+                return
+            library = self.__jit.compiled
+            for key, value in vars(library).items():
+                if not (key.startswith("__") and key.endswith("__")):
+                    self.__dict__.setdefault(key, value)
+            self.__loaded = True
+
+    def _warm_up(self):
+        """
+        Start compiling the module in the background.
+        """
+        submit(self.__jit)
+
+
 def install_hook():
     finder = StaticPyFinder()
     sys.meta_path.insert(0, finder)
@@ -1,16 +1,20 @@
-import importlib
 import inspect
 import os
-import sys
+import threading
+from importlib.util import spec_from_file_location, module_from_spec
 
 from .template import CppTemplate
 from .bind import PyBindFunction, PyBindModule
+from .common import logging
 from .common.options import get_option
-from .common.phase import TwoPhaseFunction
+from .common.phase import TwoPhaseFunction, is_building
+from .common.profile import phase, profile_build
+from .cache import make_key
 from .compiler import Compiler
+from .pool import submit
+from .prebuilt import find_prebuilt
 from .translator import BaseTranslator
 from .session import new_session, get_session
-from .common.string import get_target_filepath
 from .lang.common import get_block_or_create
 from .lang import (
     statement as S,
@@ -22,47 +26,139 @@ from .lang import (
 )
 
 
+# {id(compiled function): (compiled function, jit object)} of the functions whose
+# global name is bound to the compiled function by the `replace_global` option.
+# The references are strong on purpose: once its name is rebound, nothing else may
+# keep the jit object alive, and functions compiled later still need it to translate
+# calls. Compiled functions can't be weakly referenced either, and the entry holding
+# one is what keeps its id from being reused. It's one entry per replaced function,
+# whose library stays loaded for the life of the process anyway.
+_replaced = {}
+
+
 class JitObject(TwoPhaseFunction):
-    def __init__(self, name, obj, env={}):
+    def __init__(self, name, obj, env={}, extra_flags=(), training=None, nogil=False, substitutions=None):
         self.name = name or obj.__name__
         self.obj = obj
         self.env = env.copy()
+        self.extra_flags = list(extra_flags)
+        self.training = training
+        self.nogil = nogil
+        # {parameter: type} of a specialisation of a generic function
+        self.substitutions = substitutions or {}
         self.env[self.name] = V.Name(self.name)
-        self._signatures = []
+        if self.substitutions:
+            # recursive calls stay within the specialisation
+            self.env[obj.__name__] = V.Name(self.name)
+        self._generic = [] if self.substitutions else self._get_generic_params(obj)
+        # {argument types at call time: specialisation}
+        self._signatures = {}
+        # {name: specialisation}
+        self._specialisations = {}
+        self._parsed = None
+        # {(digest of the source, options): (block, record of the session)}
+        self._translations = {}
         self._compiled = False
         self._compiled_obj = None
-        self._source_path, self._target_path = self._get_paths(obj)
+        self._future = None
+        self._lock = threading.Lock()
+        self._module = None
+        self._source_path = self._get_source_path(obj)
+        self._libname = None
+        self._target_path = None
+        # the globals of the module defining the function
+        self._globals = None
+        # the `BuildProfile` of the last build, with the `profile` option
+        self.build_profile = None
+        self._prebuilt = None
+        if not self.substitutions and not get_option("force_compile", False):
+            self._prebuilt = find_prebuilt(self._source_path, getattr(obj, "__qualname__", ""))
 
     def compile(self):
-        sess = new_session()
-        self._add_definition(sess)
-        sess.finalize()
-        self._bind(sess)
-        self._compile(sess)
+        if self._prebuilt is not None:
+            self._libname, self._target_path = self._prebuilt
+        elif self._module is not None:
+            self._module.compile()
+        else:
+            self._libname, self._target_path = build_library([self], self.name)
 
     def load(self):
-        module_name = self.name
-        if module_name in sys.modules:
-            del sys.modules[module_name]
-        sys.path.insert(0, os.path.dirname(self._target_path))
-        try:
-            module = importlib.import_module(module_name)
-            self._compiled_obj = getattr(module, self.name)
-        finally:
-            del sys.path[0]
+        if self._module is not None:
+            library = self._module.load()
+        else:
+            library = load_library(self._libname, self._target_path)
+        self._load_from(library)
+
+    def _load_from(self, library):
+        if isinstance(self.obj, str):
+            # a `# @staticpy` module, compiled as a whole
+            self._compiled_obj = library
+        else:
+            self._compiled_obj = getattr(library, self.name)
+
+    def __call__(self, *args, **kwargs):
+        # the common case of a loaded function called from Python, in a single frame
+        if self._compiled and not kwargs and not is_building():
+            return self._compiled_obj(*args)
+        return super().__call__(*args, **kwargs)
 
     def building(self, *args):
+        if self._generic:
+            types = [self._static_type(args[i], name, annotation) for i, name, annotation in self._generic_args(args)]
+            return self._specialise(types).building(*args)
         self._add_definition(get_session())
         return E.CallFunction(self.name, args)
 
     def normal(self, *args):
+        if self._compiled:
+            return self._compiled_obj(*args)
+        if self._generic:
+            key = tuple(self._signature_key(args[i]) for i, _, _ in self._generic_args(args))
+            specialisation = self._signatures.get(key)
+            if specialisation is None:
+                types = [self._runtime_type(args[i], name, annotation) for i, name, annotation in self._generic_args(args)]
+                specialisation = self._signatures[key] = self._specialise(types)
+            return specialisation.normal(*args)
+        self._ensure_loaded()
+        if get_option("replace_global", False):
+            self._replace_global()
+        return self._compiled_obj(*args)
+
+    @property
+    def compiled(self):
+        """
+        The compiled function, loaded on first access. Calling it directly skips the
+        dispatch of the jit object.
+        """
+        if self._generic:
+            raise TypeError(f"{self.name}() has generic parameters and is compiled once per argument types")
         if not self._compiled:
-            if get_option("force_compile", False) or self._need_update():
+            self._ensure_loaded()
+        return self._compiled_obj
+
+    def _replace_global(self):
+        """
+        Bind the name of the function in its module to the compiled function, so that
+        later calls from Python don't go through the jit object.
+        """
+        if self._globals is None or self._globals.get(self.name) is not self:
+            return
+        _replaced[id(self._compiled_obj)] = (self._compiled_obj, self)
+        self._globals[self.name] = self._compiled_obj
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._compiled:
+                return
+            if self._future is not None:
+                # compiled or being compiled in the background
+                future, self._future = self._future, None
+                future.result()
+            else:
                 self.compile()
             self.load()
             self._compiled = True
             self.__doc__ = self._compiled_obj.__doc__
-        return self._compiled_obj(*args)
 
     def declare(self):
         declarations = []
@@ -73,15 +169,192 @@ class JitObject(TwoPhaseFunction):
         return declarations
 
     def _add_definition(self, sess):
+        translated = self in sess.definitions
+        # added again so that the translations being recorded depend on it
         sess.add_definition(self)
-        self._translate(sess)
+        if not translated:
+            self._translate(sess)
 
     def _translate(self, sess):
-        translator = BaseTranslator(self.env, session=sess)
-        source = self._get_source(self.obj)
-        self._block = translator.translate(source)
+        """
+        Translate the function in `sess`. The translation is made once for each source
+        and options, and reused by later sessions, to which it adds the includes and
+        definitions it added to the first one.
+        """
+        source, tree, digest = self._parse()
+        key = (digest, get_option("contiguous_variant", True), get_option("fast_math", False))
+        cached = self._translations.get(key)
+        if cached is None:
+            with sess.recording() as record, phase("translate", self.name):
+                block = self._translate_tree(sess, source, tree)
+            cached = self._translations[key] = (block, record)
+        else:
+            cached[1].replay(sess)
+        self._block = cached[0]
+        return self._block
+
+    def _parse(self):
+        """
+        (source, tree, digest) of the source, read and parsed once.
+        """
+        if self._parsed is None:
+            source, tree = BaseTranslator.parse(self._get_source(self.obj))
+            self._parsed = (source, tree, make_key(source))
+        return self._parsed
+
+    def _translate_tree(self, sess, source, tree):
+        translator = BaseTranslator(self.env, session=sess, substitutions=self._substitutions())
+        self._block = translator.translate(source, tree)
+        if get_option("contiguous_variant", True):
+            self._add_contiguous_variants(sess, source, tree)
+        for function in self._functions():
+            function.nogil = self.nogil
+            if self.substitutions and function.name == self.obj.__name__:
+                function.name = self.name
+                if function.contiguous_variant is not None:
+                    function.contiguous_variant.name = self.name + "__contiguous"
         return self._block
 
+    def _substitutions(self):
+        return {(self.obj.__name__, name): type for name, type in self.substitutions.items()}
+
+    def _functions(self):
+        return [stmt.block for stmt in self._block.statements
+                if isinstance(stmt, S.BlockStatement) and isinstance(stmt.block, B.Function)]
+
+    def _add_contiguous_variants(self, sess, source, tree):
+        """
+        Translate the functions taking strided arrays once more, assuming the arrays
+        are C-contiguous. The binding calls the variant when they are.
+        """
+        substitutions = {}
+        for function in self._functions():
+            for type, name in function.inputs:
+                if isinstance(type, T.ArrayType) and not type.is_continuous:
+                    substitutions[function.name, name] = type.contiguous
+        if not substitutions:
+            return
+        translator = BaseTranslator(self.env, session=sess, substitutions={**self._substitutions(), **substitutions})
+        variants = {stmt.block.name: stmt for stmt in translator.translate(source, tree).statements
+                    if isinstance(stmt, S.BlockStatement) and isinstance(stmt.block, B.Function)}
+        for function in self._functions():
+            if any((function.name, name) in substitutions for _, name in function.inputs):
+                stmt = variants[function.name]
+                stmt.block.name = function.name + "__contiguous"
+                stmt.block.variant_of = function
+                stmt.block.parent = self._block
+                function.contiguous_variant = stmt.block
+                self._block.add_statement(stmt)
+
+    def _get_generic_params(self, obj):
+        """
+        [(index, name, annotation)] of the parameters whose types are decided at each
+        call: those without annotation and those annotated with an abstract type, such
+        as `Floating` or `Floating[:]`. The annotation is None when it's missing.
+        """
+        if not inspect.isfunction(obj):
+            return []
+        generic = []
+        for i, param in enumerate(inspect.signature(obj).parameters.values()):
+            annotation = param.annotation
+            if annotation is inspect.Parameter.empty:
+                generic.append((i, param.name, None))
+                continue
+            if isinstance(annotation, str):
+                try:
+                    annotation = eval(annotation, self.env)
+                except Exception:
+                    continue
+            base = annotation.base if isinstance(annotation, T.ArrayType) else annotation
+            if isinstance(base, T.PrimitiveType) and base.is_abstract() and base.is_a(T.Real):
+                generic.append((i, param.name, annotation))
+        return generic
+
+    def _generic_args(self, args):
+        if len(args) < len(self._generic) or len(args) <= self._generic[-1][0]:
+            raise TypeError(f"{self.name}() takes {len(inspect.signature(self.obj).parameters)} arguments "
+                            f"but {len(args)} were given")
+        return self._generic
+
+    def _specialise(self, types):
+        """
+        The jit object compiling the function with the given types of the generic
+        parameters. Each specialisation is a library of its own, cached like any other.
+        """
+        name = "__".join([self.name] + [self._type_suffix(type) for type in types])
+        with self._lock:
+            specialisation = self._specialisations.get(name)
+            if specialisation is None:
+                substitutions = {param: type for (_, param, _), type in zip(self._generic, types)}
+                specialisation = JitObject(name, self.obj, self.env, extra_flags=self.extra_flags,
+                                           training=self.training, nogil=self.nogil, substitutions=substitutions)
+                self._specialisations[name] = specialisation
+        return specialisation
+
+    @staticmethod
+    def _type_suffix(type):
+        if isinstance(type, T.ArrayType):
+            return f"{type.base.cname()}{type.dim}d"
+        return type.cname()
+
+    @staticmethod
+    def _signature_key(arg):
+        dtype = getattr(arg, "dtype", None)
+        if dtype is None:
+            return type(arg)
+        return dtype, getattr(arg, "ndim", 0)
+
+    def _runtime_type(self, arg, name, annotation):
+        """
+        The type of the generic parameter `name` for the argument `arg` of a call.
+        """
+        dtype = getattr(arg, "dtype", None)
+        if dtype is not None:
+            base = T.from_dtype(dtype.name)
+            ndim = getattr(arg, "ndim", 0)
+        else:
+            base = {bool: T.Bool, int: T.Long, float: T.Double}.get(type(arg))
+            ndim = 0
+        if base is None:
+            raise TypeError(f"argument `{name}` of {self.name}() can't be a {type(arg).__name__}"
+                            + (f" of {dtype}" if dtype is not None else ""))
+        return self._specialised_type(base, ndim, name, annotation)
+
+    def _static_type(self, arg, name, annotation):
+        """
+        The type of the generic parameter `name` for the argument `arg` of a call from
+        another jit function.
+        """
+        type = getattr(arg, "type", None)
+        if isinstance(type, T.ArrayType):
+            base, ndim = type.base, type.dim
+        elif isinstance(type, T.PrimitiveType) and type.is_a(T.Real):
+            # literals have abstract types
+            base, ndim = {T.Integral: T.Long, T.Floating: T.Double}.get(type, type), 0
+        else:
+            raise TypeError(f"can't decide the type of argument `{name}` of {self.name}()")
+        return self._specialised_type(base, ndim, name, annotation)
+
+    def _specialised_type(self, base, ndim, name, annotation):
+        if annotation is None:
+            return T.ArrayType(base, (...,) * ndim, False) if ndim else base
+        if isinstance(annotation, T.ArrayType):
+            if ndim == annotation.dim and base.is_a(annotation.base):
+                return T.ArrayType(base, annotation.shape, annotation.is_continuous, annotation.mutable)
+        elif ndim == 0 and base.is_a(annotation):
+            return base
+        if isinstance(annotation, T.ArrayType):
+            expected = self._describe(annotation.base, annotation.dim)
+        else:
+            expected = self._describe(annotation, 0)
+        raise TypeError(f"argument `{name}` of {self.name}() must be {expected}, got {self._describe(base, ndim)}")
+
+    @staticmethod
+    def _describe(base, ndim):
+        if ndim:
+            return f"an array of {ndim} dimensions of {base!r}"
+        return repr(base)
+
     @staticmethod
     def _get_source(obj):
         if isinstance(obj, str):
@@ -91,42 +364,181 @@ class JitObject(TwoPhaseFunction):
             return inspect.getsource(obj)
 
     @staticmethod
-    def _get_paths(obj):
+    def _get_source_path(obj):
         if inspect.ismodule(obj) or inspect.isfunction(obj) or inspect.isclass(obj):
             sourcepath = inspect.getsourcefile(obj)
-            path = os.path.dirname(sourcepath)
-            name = obj.__name__
         else:
             sourcepath = obj
-            path = os.path.dirname(sourcepath)
-            name = os.path.basename(obj).split(".")[0]
-        sourcepath = os.path.abspath(sourcepath)
-        targetpath = os.path.abspath(get_target_filepath(path, name))
-        return sourcepath, targetpath
-
-    def _bind(self, sess):
-        with sess:
-            with get_block_or_create("header"):
-                M.defineM("PYBIND")
-            block = get_block_or_create("main")
-        PyBindModule(self.name, block).setup(sess)
-
-    def _compile(self, sess):
-        compiler = Compiler()
-        compiler.add_template(".cpp", CppTemplate())
-        compiler.run(sess, os.path.dirname(self._target_path), libname=self.name)
-
-    def _need_update(self):
-        if not os.path.exists(self._target_path):
-            return True
-        target_mtime = os.path.getmtime(self._target_path)
-        source_mtime = os.path.getmtime(self._source_path)
-        return source_mtime > target_mtime    
-
-
-def jit(obj):
+        return os.path.abspath(sourcepath)
+
+
+class JitModule:
+    """
+    All jit functions defined in one Python module, compiled into a single library.
+
+    The functions share one translation unit, so the pybind11 headers are parsed once
+    and one library is loaded for the whole module.
+    """
+    _modules = {}
+    _modules_lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self.members = {}
+        self._built_members = None
+        self._libname = None
+        self._target_path = None
+        self._loaded_path = None
+        self._library = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get(cls, module_name):
+        libname = module_name.replace(".", "_") + "__jit"
+        with cls._modules_lock:
+            if libname not in cls._modules:
+                cls._modules[libname] = cls(libname)
+            return cls._modules[libname]
+
+    def add(self, obj):
+        with self._lock:
+            old = self.members.get(obj.name)
+            if old is not None and old is not obj:
+                # a redefinition shadows the old function, which is compiled on its own
+                old._module = None
+            self.members[obj.name] = obj
+            obj._module = self
+
+    def compile(self):
+        with self._lock:
+            if self._built_members == self.members:
+                return
+            members = self.members.copy()
+            self._libname, self._target_path = build_library(list(members.values()), self.name)
+            self._built_members = members
+
+    def load(self):
+        with self._lock:
+            self.compile()
+            if self._loaded_path != self._target_path:
+                self._library = load_library(self._libname, self._target_path)
+                self._loaded_path = self._target_path
+            return self._library
+
+
+def build_library(objs, libname):
+    """
+    Translate the jit objects into one session, bind them in one pybind11 module
+    and compile it. Returns the name of the module and the path of the library.
+    """
+    with profile_build(libname, [obj.name for obj in objs]) as report:
+        libname, path = _build_library(objs, libname)
+        if report is not None:
+            report.libname = libname
+            for obj in objs:
+                obj.build_profile = report
+        return libname, path
+
+
+def _build_library(objs, libname):
+    extra_flags = []
+    for obj in objs:
+        extra_flags.extend(flag for flag in obj.extra_flags if flag not in extra_flags)
+    compiler = Compiler(extra_flags=extra_flags)
+    compiler.add_template(".cpp", CppTemplate())
+    sess = translate_session(objs)
+    # a process can't load two libraries under the same module name, so different
+    # builds of the same functions are told apart by a digest of their code
+    libname = f"{libname}_{make_key(*compiler.render(sess))[:8]}"
+    bind_session(sess, libname)
+    if get_option("build_mode", "release") == "pgo":
+        training = [obj for obj in objs if obj.training is not None]
+        if training:
+            return libname, build_profiled_library(compiler, sess, objs, training, libname)
+        logging.warning(f"{libname}: no training function is given, building without profile")
+    return libname, compiler.run(sess, libname=libname)
+
+
+def build_profiled_library(compiler, sess, objs, training, libname):
+    instrumented_name = libname + "_instrumented"
+    instrumented = translate_session(objs)
+    declaration, dump = compiler.driver.profile_dump_function()
+    with instrumented:
+        main = get_block_or_create("main")
+        with main:
+            main.add_statement(S.SimpleStatement(declaration))
+            function = B.Function("_staticpy_dump_profile", [], T.Void, [S.SimpleStatement(f"{dump}();")])
+            main.add_statement(S.BlockStatement(function))
+    bind_session(instrumented, instrumented_name)
+
+    def train(path):
+        with phase("training"):
+            module = load_library(instrumented_name, path)
+            for obj in training:
+                obj.training(getattr(module, obj.name))
+            module._staticpy_dump_profile()
+
+    return compiler.run_profiled(sess, instrumented, libname, train)
+
+
+def translate_session(objs):
+    sess = new_session()
+    for obj in objs:
+        obj._add_definition(sess)
+    with phase("finalize"):
+        sess.finalize()
+    return sess
+
+
+def bind_session(sess, libname):
+    with phase("bind"), sess:
+        with get_block_or_create("header"):
+            M.defineM("PYBIND")
+        block = get_block_or_create("main")
+    PyBindModule(libname, block).setup(sess)
+
+
+def load_library(libname, path):
+    spec = spec_from_file_location(libname, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def jit(obj=None, **options):
+    """
+    Compile a function with StaticPy.
+
+    Use it either as `@jit` or with options as `@jit(extra_flags=["-ffast-math"])`.
+    `extra_flags` are passed to the compiler when building this function. `training`
+    is called with the instrumented function in the "pgo" build mode. With `nogil`,
+    the function releases the GIL while it runs, so it can run in many threads at once.
+    """
     frame = inspect.currentframe().f_back
+    if obj is None:
+        return lambda obj: _jit(obj, frame, **options)
+    return _jit(obj, frame, **options)
+
+
+def _jit(obj, frame, cls=JitObject, **options):
     env = dict(__builtins__).copy()
     env.update(frame.f_globals)
     env.update(frame.f_locals)
-    return JitObject(obj.__name__, obj, env)
+    for key, value in env.items():
+        # jit functions replaced by their compiled functions are still translated as calls
+        replaced = _replaced.get(id(value))
+        if replaced is not None and replaced[0] is value:
+            env[key] = replaced[1]
+    jit_obj = cls(obj.__name__, obj, env, **options)
+    jit_obj._globals = frame.f_globals
+    if jit_obj._generic or jit_obj._prebuilt is not None:
+        # nothing to compile ahead: specialisations are compiled when the function is
+        # called, and prebuilt libraries are only loaded
+        return jit_obj
+    if get_option("batch_module", False):
+        # the library of the module is built once, on the first call, rather than
+        # in the background each time one more function is defined
+        JitModule.get(frame.f_globals.get("__name__", "__main__")).add(jit_obj)
+    elif get_option("background_compile", False):
+        submit(jit_obj)
+    return jit_obj
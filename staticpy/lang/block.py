@@ -4,6 +4,9 @@ from . import statement as S
 
 
 class Block:
+    # the attributes holding expressions, which optimisations rewrite
+    fields = ()
+
     def __init__(self, statements=None):
         self.statements = statements or []
         self.parent = None
@@ -47,6 +50,8 @@ class Scope(Block):
 
 
 class If(Scope):
+    fields = ("condition", )
+
     def __init__(self, condition, statements):
         self.condition = condition
         super().__init__(statements)
@@ -74,6 +79,7 @@ class Else(Scope):
 
 class For(Scope):
     _loop_var_counter = 0
+    fields = ("start", "stop")
 
     def __init__(self, variable, start, stop, step, statements, declare=False):
         self.variable = variable
@@ -103,7 +109,30 @@ class For(Scope):
         return self.variable
 
 
+class ParallelFor(For):
+    """
+    A for loop run by a team of OpenMP threads. `private` is a list of the names
+    of the variables of the enclosing scopes each thread has a copy of, and
+    `reductions` a list of `(operator, name)` pairs of the variables combined
+    across the threads.
+    """
+    def __init__(self, variable, start, stop, step, statements, declare=False, private=(), reductions=()):
+        self.private = list(private)
+        self.reductions = list(reductions)
+        super().__init__(variable, start, stop, step, statements, declare)
+
+    def translate(self):
+        pragma = "#pragma omp parallel for"
+        if self.private:
+            pragma += f" private({', '.join(self.private)})"
+        for op, name in self.reductions:
+            pragma += f" reduction({op}:{name})"
+        return [pragma] + super().translate()
+
+
 class While(Scope):
+    fields = ("condition", )
+
     def __init__(self, condition, statements):
         self.condition = condition
         super().__init__(statements)
@@ -113,14 +142,32 @@ class While(Scope):
 
 
 class Function(Scope):
-    def __init__(self, name, inputs, output, statements, static=False, doc=""):
+    def __init__(self, name, inputs, output, statements, static=False, doc="", nogil=False):
         self.name = name
         self.inputs = inputs
         self.output = output
         self.doc = doc
         self.static = static
+        # the binding releases the GIL while the function runs
+        self.nogil = nogil
+        # the same function specialised for C-contiguous arrays, called instead of
+        # this one by the binding when the arrays passed in are contiguous
+        self.contiguous_variant = None
+        self.variant_of = None
+        # the code of the statements, once they're rendered
+        self._body = None
         super().__init__(statements)
 
+    def translate(self):
+        """
+        The statements are rendered once. Their expressions aren't used afterwards, so
+        they are let go rather than held for as long as the translation is cached.
+        """
+        if self._body is None:
+            self._body = ["  " + line for stmt in self.statements for line in stmt.translate()]
+            self.statements = []
+        return [self.prefix()] + self._body + [self.suffix()]
+
     def prefix(self):
         qualifier = "static " if self.static else ""
         ret_type = str(self.output)
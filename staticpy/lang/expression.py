@@ -6,62 +6,175 @@ from .common.string import stringify_arguments
 
 
 class Expression(Value):
-    pass
+    """
+    A node of an expression tree. Nodes keep their operands, and are rendered to
+    C++ when they are turned into a string, which statements do once, at template
+    time. The uses of a variable share a node.
+
+    Rendering writes the code of the operands into the code of the node, rather
+    than turning them into strings of their own, so that it takes time and memory
+    in proportion to the size of the code, however deep the expression.
+
+    Functions hold many nodes, so they have slots rather than a `__dict__`.
+    """
+    __slots__ = ()
+    # the attributes holding the operands, which optimisations rewrite
+    fields = ()
+
+    def __str__(self):
+        code = []
+        append = code.append
+        # the pieces left to write, the next one last
+        stack = [self]
+        pop = stack.pop
+        while stack:
+            piece = pop()
+            if type(piece) is str:
+                append(piece)
+            elif Expression in type(piece).__mro__:
+                pieces = []
+                piece.write(pieces)
+                pieces.reverse()
+                stack += pieces
+            else:
+                append(str(piece))
+        return "".join(code)
+
+    @abc.abstractmethod
+    def write(self, out):
+        """
+        Append the pieces of code and the operands of the expression, in order, to
+        the list `out`.
+        """
+
+    def infer(self):
+        """
+        The type of the expression, computed from its operands. None if it's unknown.
+        """
+        return self.type
+
+
+def operand_type(value):
+    """
+    The C++ type of an operand. Constants are typed as their literals are: `int`,
+    or `long` when it doesn't fit, and `double`.
+    """
+    if type(value) is Const:
+        if type(value.value) is bool:
+            return T.Bool
+        if type(value.value) is int:
+            return T.Int if -(1 << 31) <= value.value < (1 << 31) else T.Long
+        if type(value.value) is float:
+            return T.Double
+    return value.type
+
+
+_arithmetic_ranks = {T.Int: 0, T.Long: 1, T.Float: 2, T.Double: 3}
+
+
+def promoted_type(type):
+    """
+    The type an operand is computed as: `bool`, `char` and `short` are promoted to `int`.
+    """
+    if type in _arithmetic_ranks:
+        return type
+    if isinstance(type, T.PrimitiveType) and type.is_a(T.Integral) and 0 < type.size < T.Int.size:
+        return T.Int
+    return type
+
+
+def arithmetic_type(*operands):
+    """
+    The type of an arithmetic operation by the usual arithmetic conversions, or
+    None if an operand isn't of a concrete arithmetic type.
+    """
+    result, rank = None, -1
+    for operand in operands:
+        type = promoted_type(operand_type(operand))
+        if type not in _arithmetic_ranks:
+            return None
+        if _arithmetic_ranks[type] > rank:
+            result, rank = type, _arithmetic_ranks[type]
+    return result
+
+
+def shift_type(value, shift):
+    return arithmetic_type(value)
+
+
+def boolean_type(*operands):
+    return T.Bool
 
 
 class OpExpression(Expression):
+    __slots__ = ()
     level = 0
 
-    def add_bracket(self, other):
-        if isinstance(other, OpExpression) and other.level <= self.level:
-            return f"({other})"
+    def add_bracket(self, other, out):
+        """
+        Append the operand, in brackets unless it binds tighter.
+        """
+        if OpExpression in type(other).__mro__ and other.level <= self.level:
+            out += ("(", other, ")")
         else:
-            return str(other)
+            out.append(other)
 
 
-def unary_expression(name, op, level=None):
+def unary_expression(name, op, level=None, result=arithmetic_type):
     my_name = name
     my_op = op
     my_level = level
 
     class UnaryExpression(OpExpression):
+        __slots__ = ("item", )
         op = my_op
         name = my_name
         level = my_level
+        fields = ("item", )
 
         def __init__(self, item):
-            self.item = self.add_bracket(cast_value_to_expression(item))
-            super().__init__()
+            self.item = cast_value_to_expression(item)
+            super().__init__(self.infer())
+
+        def infer(self):
+            return result(self.item)
 
         def __repr__(self):
             return f"{self.name}({self.item})"
 
-        def __str__(self):
-            return f"{self.op}({self.item})"
+        def write(self, out):
+            out += (f"{self.op}(", self.item, ")")
 
     return UnaryExpression
 
 
-def binary_expression(name, op, level=None):
+def binary_expression(name, op, level=None, result=arithmetic_type):
     my_name = name
     my_op = op
     my_level = level
 
     class BinaryExpression(OpExpression):
+        __slots__ = ("item1", "item2")
         op = my_op
         name = my_name
         level = my_level
+        fields = ("item1", "item2")
 
         def __init__(self, item1, item2):
-            self.item1 = self.add_bracket(cast_value_to_expression(item1))
-            self.item2 = self.add_bracket(cast_value_to_expression(item2))
-            super().__init__()
+            self.item1 = cast_value_to_expression(item1)
+            self.item2 = cast_value_to_expression(item2)
+            super().__init__(self.infer())
+
+        def infer(self):
+            return result(self.item1, self.item2)
 
         def __repr__(self):
             return f"{self.name}({self.item1}, {self.item2})"
 
-        def __str__(self):
-            return f"{self.item1} {self.op} {self.item2}"
+        def write(self, out):
+            self.add_bracket(self.item1, out)
+            out.append(f" {self.op} ")
+            self.add_bracket(self.item2, out)
 
     return BinaryExpression
 
@@ -72,40 +185,44 @@ def compare_expression(name, op, level=None):
     my_level = level
 
     class BinaryExpression(OpExpression):
+        __slots__ = ("item1", "item2")
         op = my_op
         name = my_name
         level = my_level
+        fields = ("item1", "item2")
 
         def __init__(self, item1, item2):
-            self.item1 = self.add_bracket(cast_value_to_expression(item1))
-            self.item2 = self.add_bracket(cast_value_to_expression(item2))
-            super().__init__()
+            self.item1 = cast_value_to_expression(item1)
+            self.item2 = cast_value_to_expression(item2)
+            super().__init__(T.Bool)
 
         def __repr__(self):
             return f"{self.item1} {self.op} {self.item2}"
 
-        def __str__(self):
-            return f"{self.item1} {self.op} {self.item2}"
+        def write(self, out):
+            self.add_bracket(self.item1, out)
+            out.append(f" {self.op} ")
+            self.add_bracket(self.item2, out)
 
     return BinaryExpression
 
 
 UnaryPositive = unary_expression('UnaryPositive', '+', 16)
 UnaryNegative = unary_expression('UnaryNegative', '-', 16)
-UnaryNot = unary_expression('UnaryNot', '!', 16)
+UnaryNot = unary_expression('UnaryNot', '!', 16, boolean_type)
 UnaryInvert = unary_expression('UnaryInvert', '~', 16)
 BinaryMultiply = binary_expression('BinaryMultiply', '*', 14)
 BinaryDivide = binary_expression('BinaryDivide', '/', 14)
 BinaryModulo = binary_expression('BinaryModulo', '%', 14)
 BinaryAdd = binary_expression('BinaryAdd', '+', 13)
 BinarySubtract = binary_expression('BinarySubtract', '-', 13)
-BinaryLShift = binary_expression('BinaryLShift', '<<', 12)
-BinaryRShift = binary_expression('BinaryRShift', '>>', 12)
+BinaryLShift = binary_expression('BinaryLShift', '<<', 12, shift_type)
+BinaryRShift = binary_expression('BinaryRShift', '>>', 12, shift_type)
 BinaryAnd = binary_expression('BinaryAdd', '&', 8)
 BinaryXor = binary_expression('BinaryXor', '^', 7)
 BinaryOr = binary_expression('BinaryOr', '|', 7)
-LogicalAnd = binary_expression('LogicalAnd', '&&', 6)
-LogicalOr = binary_expression('LogicalOr', '||', 5)
+LogicalAnd = binary_expression('LogicalAnd', '&&', 6, boolean_type)
+LogicalOr = binary_expression('LogicalOr', '||', 5, boolean_type)
 CompareGT = compare_expression('GreaterThan', '>', 11)
 CompareLT = compare_expression('LessThan', '<', 11)
 CompareGE = compare_expression('GreaterEqual', '>=', 11)
@@ -115,23 +232,28 @@ CompareNE = compare_expression('NotEqual', '!=', 11)
 
 
 class AddressOf(OpExpression):
+    __slots__ = ("item", )
     op = "&"
     name = "AddressOf"
     level = 16
+    fields = ("item", )
 
     def __init__(self, item):
         self.item = cast_value_to_expression(item)
-        type = self.item.type.ptr() if self.item.type is not None else None
-        super().__init__(type)
+        super().__init__(self.infer())
+
+    def infer(self):
+        return self.item.type.ptr() if self.item.type is not None else None
 
     def __repr__(self):
         return f"{self.name}({self.item})"
 
-    def __str__(self):
-        return f"{self.op}{self.item}"
+    def write(self, out):
+        out += (self.op, self.item)
 
 
 class ScopeAnalysis(OpExpression):
+    __slots__ = ("item1", "item2")
     op = "::"
     name = "ScopeAnalysis"
     level = 18
@@ -144,47 +266,68 @@ class ScopeAnalysis(OpExpression):
     def __repr__(self):
         return f"{self.name}({self.item1}, {self.item2})"
 
-    def __str__(self):
-        return f"{self.item1}{self.op}{self.item2}"
+    def write(self, out):
+        out += (self.item1, self.op, self.item2)
 
 
 class IIf(OpExpression):
+    __slots__ = ("condition", "value_if_true", "value_if_false")
     level = 17
+    fields = ("condition", "value_if_true", "value_if_false")
 
     def __init__(self, condition, value_if_true, value_if_false):
-        self.condition = self.add_bracket(cast_value_to_expression(condition))
-        self.value_if_true = self.add_bracket(cast_value_to_expression(value_if_true))
-        self.value_if_false = self.add_bracket(cast_value_to_expression(value_if_false))
-        super().__init__()
+        self.condition = cast_value_to_expression(condition)
+        self.value_if_true = cast_value_to_expression(value_if_true)
+        self.value_if_false = cast_value_to_expression(value_if_false)
+        super().__init__(self.infer())
 
-    def __str__(self):
-        return f"{self.condition} ? {self.value_if_true} : {self.value_if_false}"
+    def infer(self):
+        type = arithmetic_type(self.value_if_true, self.value_if_false)
+        if type is None and self.value_if_true.type is self.value_if_false.type:
+            type = self.value_if_true.type
+        return type
+
+    def write(self, out):
+        self.add_bracket(self.condition, out)
+        out.append(" ? ")
+        self.add_bracket(self.value_if_true, out)
+        out.append(" : ")
+        self.add_bracket(self.value_if_false, out)
 
 
 class CallFunction(Expression):
+    __slots__ = ("func", "args")
+    fields = ("args", )
+
     def __init__(self, func, args, type=None):
         self.func = func
         self.args = tuple(map(cast_value_to_expression, args))
         super().__init__(type)
 
-    def __str__(self):
-        name = self.func
-        args = ", ".join(map(str, self.args))
-        return f"{name}({args})"
+    def write(self, out):
+        out += (self.func, "(")
+        for i, arg in enumerate(self.args):
+            if i:
+                out.append(", ")
+            out.append(arg)
+        out.append(")")
 
 
 class TemplateInstantiate(Expression):
+    __slots__ = ("name", "args")
+
     def __init__(self, name, args):
         self.name = name
         self.args = args
         super().__init__()
 
-    def __str__(self):
-        args = "<" + stringify_arguments(self.args) + ">"
-        return str(self.name) + args
+    def write(self, out):
+        out += (self.name, "<" + stringify_arguments(self.args) + ">")
 
 
 class Const(Expression):
+    __slots__ = ("value", )
+
     def __init__(self, value):
         self.value = value
         super().__init__(self.infer_type(value))
@@ -204,25 +347,29 @@ class Const(Expression):
         else:
             raise TypeError(f"type '{type(value)} not supported")
 
-    def __str__(self):
+    def write(self, out):
         if self.type is T.String:
             value = self.value.replace("\\", "\\\\").replace("\"", "\\\"")
-            return f'"{value}"'
+            out.append(f'"{value}"')
         else:
-            return str(self.value).lower()
+            out.append(str(self.value).lower())
 
 
 class Var(Expression):
+    __slots__ = ("variable", )
+
     def __init__(self, variable):
         self.variable = variable
         super().__init__(variable.type)
 
-    def __str__(self):
-        return str(self.variable)
+    def write(self, out):
+        out.append(str(self.variable))
 
 
 class GetAttr(Expression):
+    __slots__ = ("obj", "attr", "symbol")
     level = 19
+    fields = ("obj", )
 
     def __init__(self, obj, attr, symbol=None):
         self.obj = obj
@@ -233,53 +380,83 @@ class GetAttr(Expression):
             else:
                 symbol = "."
         self.symbol = symbol
+        super().__init__()
 
-    def __str__(self):
-        return self.symbol.join(map(str, [self.obj, self.attr]))
+    def write(self, out):
+        out += (self.obj, self.symbol, self.attr)
 
 
 class GetItem(Expression):
+    __slots__ = ("obj", "index")
     level = 19
+    fields = ("obj", "index")
 
     def __init__(self, obj, index):
         self.obj = obj
         self.index = index
         super().__init__()
 
-    def __str__(self):
-        return f"{self.obj}[{self.index}]"
+    def write(self, out):
+        out += (self.obj, "[", self.index, "]")
+
+
+class ArrayItem(GetItem):
+    """
+    An element of an array.
+    """
+    __slots__ = ("array", )
+
+    def __init__(self, array, obj, index):
+        self.array = array
+        super().__init__(obj, index)
+        self.type = self.infer()
+
+    def infer(self):
+        return self.array.type.base
 
 
 class StaticCast(Expression):
+    __slots__ = ("expr", )
     level = 19
+    fields = ("expr", )
 
     def __init__(self, expr: Expression, astype):
         self.expr = cast_value_to_expression(expr)
         super().__init__(astype)
 
-    def __str__(self):
-        return f"static_cast<{self.type}>({self.expr})"
+    def write(self, out):
+        out += (f"static_cast<{self.type}>(", self.expr, ")")
 
 
 class Cast(Expression):
+    __slots__ = ("expr", )
     level = 19
+    fields = ("expr", )
 
     def __init__(self, expr: Expression, astype):
         self.expr = cast_value_to_expression(expr)
         super().__init__(astype)
 
-    def __str__(self):
-        return f"({self.type})({self.expr})"
+    def write(self, out):
+        out += (f"({self.type})(", self.expr, ")")
 
 
 class initializer_list(Expression):
+    __slots__ = ("args", )
     level = 19
+    fields = ("args", )
 
     def __init__(self, *args):
         self.args = args
+        super().__init__()
 
-    def __str__(self):
-        return "{" + ", ".join(map(str, self.args)) + "}"
+    def write(self, out):
+        out.append("{")
+        for i, arg in enumerate(self.args):
+            if i:
+                out.append(", ")
+            out.append(arg)
+        out.append("}")
 
 
 def compare_op(opname):
@@ -293,12 +470,31 @@ def compare_op(opname):
     return mapping[opname]
 
 
+# {type of a value: the function turning the value into an expression}
+_casts = {}
+
+
 def cast_value_to_expression(value):
-    from .variable import Variable, Name
-    if isinstance(value, Expression):
-        pass
-    elif isinstance(value, (Variable, Name)):
-        value = Var(value)
-    else:
-        value = Const(value)
+    cast = _casts.get(type(value))
+    if cast is None:
+        from .variable import Variable, Name
+        if issubclass(type(value), Expression):
+            cast = _identity
+        elif issubclass(type(value), (Variable, Name)):
+            cast = _var
+        else:
+            cast = Const
+        _casts[type(value)] = cast
+    return cast(value)
+
+
+def _identity(value):
     return value
+
+
+def _var(variable):
+    # one node for all the uses of a variable, as nodes aren't changed once built
+    var = variable.__dict__.get("_var")
+    if var is None or var.type is not variable.type:
+        var = variable._var = Var(variable)
+    return var
@@ -0,0 +1,338 @@
+"""
+Optimisations of the expressions of a translated function, made before they are
+turned into strings:
+
+- constant folding: operations on numeric constants are computed as C++ would,
+  and adding 0 or multiplying by 1 is dropped;
+- strength reduction: dividing by a power of two multiplies by its reciprocal,
+  which is exact. With the `fast_math` option, dividing a floating value by any
+  constant does, which may change the last bit of the result. Only divisions
+  computed as `double` are rewritten, as the reciprocal is a `double` literal;
+- index hoisting: the terms of an array index that don't change within a `for`
+  loop are summed once before the loop, in a local shared by all the indices of
+  the loop using the same terms.
+
+The translator folds each node as it builds it, whose operands are folded already.
+Hoisting is a pass over the translated function.
+"""
+import functools
+import math
+
+from . import block as B, expression as E, statement as S, type as T, variable as V
+
+# -2**63 can't be written as a literal
+_LONG_MIN, _LONG_MAX = -(1 << 63) + 1, (1 << 63) - 1
+
+
+def optimize(function):
+    """
+    Hoist the invariant index terms out of the loops of the `B.Function`, in place.
+    """
+    _Hoister().visit(function)
+    return function
+
+
+def walk(expr):
+    """
+    Yield the nodes of the expression.
+    """
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        fields = getattr(type(node), "fields", None)
+        if fields is None:
+            continue
+        yield node
+        for name in fields:
+            value = getattr(node, name)
+            if type(value) is tuple:
+                stack.extend(value)
+            else:
+                stack.append(value)
+
+
+# ============= folding =============
+def _c_divide(a, b):
+    # C++ rounds the quotient toward zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+_integral_operations = {
+    E.BinaryAdd: lambda a, b: a + b,
+    E.BinarySubtract: lambda a, b: a - b,
+    E.BinaryMultiply: lambda a, b: a * b,
+    E.BinaryDivide: lambda a, b: _c_divide(a, b) if b else None,
+    E.BinaryModulo: lambda a, b: a - b * _c_divide(a, b) if b else None,
+    E.BinaryLShift: lambda a, b: a << b if a >= 0 and 0 <= b < 63 else None,
+    E.BinaryRShift: lambda a, b: a >> b if a >= 0 and 0 <= b < 63 else None,
+    E.BinaryAnd: lambda a, b: a & b,
+    E.BinaryXor: lambda a, b: a ^ b,
+    E.BinaryOr: lambda a, b: a | b,
+}
+
+_floating_operations = {
+    E.BinaryAdd: lambda a, b: a + b,
+    E.BinarySubtract: lambda a, b: a - b,
+    E.BinaryMultiply: lambda a, b: a * b,
+    E.BinaryDivide: lambda a, b: a / b if b else None,
+}
+
+
+def _number(expr):
+    if type(expr) is E.Const and type(expr.value) in (int, float):
+        return expr.value
+    return None
+
+
+def _is_int(value, n):
+    return type(value) is int and value == n
+
+
+_index_operations = (E.BinaryAdd, E.BinarySubtract, E.BinaryMultiply)
+
+
+def is_index(expr):
+    """
+    Whether the expression is an integer computed without side effects, like the
+    index of an array.
+    """
+    kind = type(expr)
+    if kind is E.Const:
+        return type(expr.value) is int
+    if kind in _index_operations:
+        return is_index(expr.item1) and is_index(expr.item2)
+    if kind is E.Var:
+        return isinstance(expr.type, T.PrimitiveType) and expr.type.is_a(T.Integral)
+    return _array_attribute(expr) is not None
+
+
+def _array_attribute(expr):
+    """
+    The array variable of `array.shape[i]` or `array.estrides[i]` with a constant `i`.
+    """
+    if type(expr) is not E.GetItem or type(expr.obj) is not E.GetAttr:
+        return None
+    if str(expr.obj.attr) not in ("shape", "estrides"):
+        return None
+    array = expr.obj.obj.variable if type(expr.obj.obj) is E.Var else expr.obj.obj
+    if type(_constant_index(expr)) is not int or not isinstance(array, V.Variable):
+        return None
+    return array
+
+
+def _constant_index(expr):
+    return expr.index.value if type(expr.index) is E.Const else expr.index
+
+
+def fold(expr, fast_math=False):
+    """
+    Fold the node, whose operands are folded already.
+    """
+    operation = type(expr)
+    if operation is E.UnaryNegative or operation is E.UnaryPositive:
+        value = _number(expr.item)
+        if value is not None:
+            value = -value if operation is E.UnaryNegative else value
+            if type(value) is float or _LONG_MIN <= value <= _LONG_MAX:
+                return E.Const(value)
+        return expr
+    if operation not in _integral_operations:
+        return expr
+    a, b = _number(expr.item1), _number(expr.item2)
+    if a is not None and b is not None:
+        if type(a) is int and type(b) is int:
+            value = _integral_operations[operation](a, b)
+            if value is not None and _LONG_MIN <= value <= _LONG_MAX:
+                return E.Const(value)
+        elif operation in _floating_operations:
+            value = _floating_operations[operation](float(a), float(b))
+            if value is not None and math.isfinite(value):
+                return E.Const(value)
+        return expr
+    if operation is E.BinaryAdd:
+        if _is_int(a, 0):
+            return expr.item2
+        if _is_int(b, 0):
+            return expr.item1
+    elif operation is E.BinarySubtract:
+        if _is_int(b, 0):
+            return expr.item1
+    elif operation is E.BinaryMultiply:
+        if _is_int(a, 1):
+            return expr.item2
+        if _is_int(b, 1):
+            return expr.item1
+        if (_is_int(a, 0) and is_index(expr.item2)) or (_is_int(b, 0) and is_index(expr.item1)):
+            return E.Const(0)
+    elif operation is E.BinaryDivide:
+        if _is_int(b, 1):
+            return expr.item1
+        # the double literal of the reciprocal would promote a float division
+        if b is not None and E.arithmetic_type(expr.item1, expr.item2) is T.Double:
+            reciprocal = _reciprocal(b, fast_math)
+            if reciprocal is not None:
+                return E.BinaryMultiply(expr.item1, E.Const(reciprocal))
+    return expr
+
+
+def _reciprocal(value, inexact):
+    """
+    1 / value, if it's exact or `inexact` is allowed.
+    """
+    value = float(value)
+    if value == 0 or not math.isfinite(value):
+        return None
+    reciprocal = 1 / value
+    if reciprocal == 0 or not math.isfinite(reciprocal):
+        return None
+    if inexact or (abs(math.frexp(value)[0]) == 0.5 and abs(math.frexp(reciprocal)[0]) == 0.5):
+        return reciprocal
+    return None
+
+
+# ============= hoisting =============
+class _Hoister:
+    """
+    The pass runs before anything is rendered, so it replaces the indices of the
+    array items in place.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def visit(self, block):
+        """
+        Hoist the invariant index terms out of the loops in the block. Returns the
+        names of the variables the block may change, or None if it can't be told,
+        and the array items in the block outside of its loops.
+        """
+        changed = set() if isinstance(block, _analysed_blocks) else None
+        items = []
+        statements = []
+        for stmt in block.statements:
+            if type(stmt) is S.BlockStatement:
+                inner = stmt.block
+                names, inner_items = self.visit(inner)
+                escaping, field_items = _inspect(getattr(inner, name) for name in type(inner).fields)
+                names = _union(names, escaping)
+                if isinstance(inner, B.For):
+                    names = _union(names, {str(inner.variable.name)})
+                    statements.extend(self.hoist(names, inner_items))
+                    inner_items = []
+                items += inner_items + field_items
+            else:
+                names, stmt_items = _changed_by(stmt)
+                items += stmt_items
+            changed = _union(changed, names)
+            statements.append(stmt)
+        block.statements = statements
+        return changed, items
+
+    def hoist(self, changed, items):
+        """
+        Move the invariant terms of the indices of the array items out of the loop
+        changing the variables `changed`. Returns the declarations to put before the
+        loop.
+        """
+        if changed is None:
+            return []
+        locals = {}
+        for item in items:
+            terms = _terms(E.cast_value_to_expression(item.index))
+            keys = [_invariant_key(term, changed) for term in terms]
+            if not any(key is not None and isinstance(term, E.OpExpression) for term, key in zip(terms, keys)):
+                continue
+            key = tuple(key for key in keys if key is not None)
+            if key not in locals:
+                hoisted = functools.reduce(E.BinaryAdd, [term for term, key in zip(terms, keys) if key is not None])
+                variable = V.Variable(f"_sp_index{self.count}", T.Long)
+                self.count += 1
+                locals[key] = S.VariableDeclaration(variable, hoisted, ["const"])
+            variant = [term for term, key in zip(terms, keys) if key is None]
+            item.index = functools.reduce(E.BinaryAdd, [E.Var(locals[key].variable)] + variant)
+        return list(locals.values())
+
+
+_analysed_blocks = (B.Function, B.EmptyBlock, B.If, B.Else, B.While, B.For)
+
+
+def _union(a, b):
+    if a is None or b is None:
+        return None
+    return a | b
+
+
+def _terms(expr):
+    if type(expr) is E.BinaryAdd:
+        return _terms(expr.item1) + _terms(expr.item2)
+    return [expr]
+
+
+def _invariant_key(expr, changed):
+    """
+    None if the index expression may change with the variables `changed`. Otherwise
+    a key, equal for the expressions computing the same thing: an int for constants,
+    a string for variables, and a tuple for operations and array attributes.
+    """
+    kind = type(expr)
+    if kind is E.Const:
+        return expr.value if type(expr.value) is int else None
+    if kind in _index_operations:
+        key1 = _invariant_key(expr.item1, changed)
+        key2 = key1 if key1 is None else _invariant_key(expr.item2, changed)
+        return None if key2 is None else (kind.op, key1, key2)
+    if kind is E.Var:
+        variable = expr.variable
+        if isinstance(variable, V.Variable) and is_index(expr) and str(variable.name) not in changed:
+            return str(variable.name)
+        return None
+    array = _array_attribute(expr)
+    if array is None or str(array.name) in changed:
+        return None
+    return (str(expr.obj.attr), str(array.name), _constant_index(expr))
+
+
+def _names(expr):
+    return {str(node.variable.name) for node in walk(expr) if type(node) is E.Var}
+
+
+def _inspect(expressions, everything=False):
+    """
+    The names of the variables the expressions may change, and the array items in
+    them. Variables passed to functions, or whose address is taken, may be changed,
+    and with `everything`, all of them.
+    """
+    names, items = set(), []
+    for expr in expressions:
+        for node in walk(expr):
+            kind = type(node)
+            if kind is E.ArrayItem:
+                items.append(node)
+            elif kind is E.Var:
+                if everything:
+                    names.add(str(node.variable.name))
+            elif kind is E.CallFunction:
+                for arg in node.args:
+                    names |= _names(arg)
+            elif kind is E.AddressOf:
+                names |= _names(node.item)
+    return names, items
+
+
+def _changed_by(stmt):
+    """
+    The names of the variables the statement may change, or None if it can't be
+    told, and the array items in it.
+    """
+    kind = type(stmt)
+    # such as `cin >> n`
+    changed, items = _inspect((getattr(stmt, name) for name in kind.fields), kind is S.ExpressionStatement)
+    if kind is S.SimpleStatement or kind is S.SetAttr:
+        return None, items
+    if kind is S.VariableDeclaration:
+        changed.add(str(stmt.variable.name))
+    target = getattr(stmt, "target", None)
+    variable = target.variable if type(target) is E.Var else target
+    if isinstance(variable, V.Variable):
+        changed.add(str(variable.name))
+    return changed, items
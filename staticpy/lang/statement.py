@@ -7,12 +7,17 @@ from .common import auto_add
 
 
 class Statement(abc.ABC):
+    # the attributes holding expressions, which optimisations rewrite
+    fields = ()
+
     @abc.abstractmethod
     def translate(self) -> typing.List[str]:
         pass
 
 
 class VariableDeclaration(Statement):
+    fields = ("init", )
+
     def __init__(self, var, init=None, qualifiers=None):
         self.variable = var
         self.init = init
@@ -40,6 +45,8 @@ class SimpleStatement(Statement):
 
 
 class Assign(Statement):
+    fields = ("target", "expr")
+
     def __init__(self, target, expr):
         self.target = target
         self.expr = expr
@@ -49,6 +56,8 @@ class Assign(Statement):
 
 
 class SetAttr(Statement):
+    fields = ("value", )
+
     def __init__(self, obj, attr, value):
         self.obj = obj
         self.attr = attr
@@ -59,6 +68,8 @@ class SetAttr(Statement):
 
 
 class SetItem(Statement):
+    fields = ("index", "value")
+
     def __init__(self, obj, index, value):
         self.obj = obj
         self.index = index
@@ -69,6 +80,8 @@ class SetItem(Statement):
 
 
 class ReturnValue(Statement):
+    fields = ("expr", )
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -77,6 +90,8 @@ class ReturnValue(Statement):
 
 
 class ExpressionStatement(Statement):
+    fields = ("expr", )
+
     def __init__(self, expr):
         self.expr = expr
 
@@ -110,6 +125,7 @@ def inplace_statement(name, op):
     class InplaceStatement(Statement):
         name = my_name
         op = my_op
+        fields = ("target", "expr")
 
         def __init__(self, target, expr: E.Expression):
             self.target = target
@@ -1,3 +1,3 @@
 from .base import TypeBase, PointerType, ReferenceType
-from .primitive import PrimitiveType, Void, Bool, Integral, Int, Long, Floating, Float, Double, BuiltInType, AutoType
+from .primitive import PrimitiveType, Void, Bool, Real, Integral, Int, Long, Floating, Float, Double, BuiltInType, AutoType, from_dtype
 from .derived import ArrayType, OtherType, UserDefinedClassType, String
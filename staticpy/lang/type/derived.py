@@ -2,6 +2,7 @@
 from types import MethodType
 
 from .base import TypeBase
+from .primitive import Long
 from ..variable import Name
 
 
@@ -27,7 +28,7 @@ class ArrayType(DerivedType):
     class ShapeProxy:
         def __init__(self, var):
             self.var = var
-            self._shape = var._shape
+            self._shape = var.type.shape
 
         def __len__(self):
             return len(self._shape)
@@ -37,18 +38,38 @@ class ArrayType(DerivedType):
             if isinstance(i, int) and isinstance(self._shape[i], int):
                 return self._shape[i]
             else:
-                return E.GetItem(E.GetAttr(self.var, "shape"), i)
+                extent = E.GetItem(E.GetAttr(self.var, "shape"), i)
+                # as declared by `Array`
+                extent.type = Long
+                return extent
 
-    def __init__(self, base, shape, is_continuous):
+    def __init__(self, base, shape, is_continuous, mutable=False):
         self.base = base
         self.shape = shape
         self.dim = len(shape)
         self.itemsize = base.size
         self.is_continuous = is_continuous
+        self.mutable = mutable
+
+    @property
+    def mut(self):
+        """
+        The writable variant of this array type, as in `Double[:].mut`.
+        """
+        return ArrayType(self.base, self.shape, self.is_continuous, mutable=True)
+
+    @property
+    def contiguous(self):
+        """
+        The variant of this array type whose elements are known to be laid out in
+        row-major order without gaps.
+        """
+        return ArrayType(self.base, self.shape, True, self.mutable)
 
     def cname(self):
         from .. import expression as E, variable as V
-        return E.TemplateInstantiate(V.Name("Array"), (self.base, len(self.shape)))
+        base = self.base if self.mutable else V.Name(f"const {self.base.cname()}")
+        return E.TemplateInstantiate(V.Name("Array"), (base, len(self.shape)))
 
     def prefix(self):
         return ""
@@ -61,30 +82,55 @@ class ArrayType(DerivedType):
         clas = E.ScopeAnalysis(V.Name("py"), V.Name("buffer"))
         return OtherType(clas)
 
-    def v__init__(t, self):
-        self._shape = t.shape
-        self.shape = ArrayType.ShapeProxy(self)
-        self.dim = t.dim
-        self.itemsize = t.itemsize
+    def returned(self):
+        """
+        The type an array is converted to when it's returned to Python.
+        """
+        from .. import expression as E, variable as V
+        clas = E.ScopeAnalysis(V.Name("py"), V.Name("array_t"))
+        return OtherType(E.TemplateInstantiate(clas, (self.base, )))
+
+    def empty(self, *shape):
+        """
+        A new writable C-contiguous array owning its memory, with uninitialized
+        elements. In Python it's a numpy array.
+        """
+        from .. import expression as E, variable as V
+        from ...common.phase import is_building
+        if len(shape) != self.dim:
+            raise TypeError(f"expected {self.dim} sizes, got {len(shape)}")
+        if is_building():
+            t = self.mut
+            return E.CallFunction(E.ScopeAnalysis(t.cname(), V.Name("empty")), shape, type=t)
+        import numpy as np
+        return np.empty(shape, self.base.dtype)
+
+    def v_shape(t, self):
+        return ArrayType.ShapeProxy(self)
+
+    def v_dim(t, self):
+        return t.dim
+
+    def v_itemsize(t, self):
+        return t.itemsize
 
     def v__getitem__(t, self, indices):
         from .. import expression as E
+        from ..optimize import fold
         # TODO: optionally wrap-around indices
         if not isinstance(indices, tuple):
             indices = (indices, )
         indices = [x.value if isinstance(x, E.Const) else x for x in indices]
         if self.type.is_continuous:
-            strides = [self.shape[i] for i in range(1, self.dim)] + [1]
-            index = indices[0] * strides[0]
-            for idx, stride in zip(indices[1:], strides[1:]):
-                index = index + idx * stride
+            index = indices[0]
+            for i, idx in enumerate(indices[1:], 1):
+                index = fold(E.BinaryAdd(fold(E.BinaryMultiply(index, self.shape[i])), idx))
         else:
-            strides = E.GetAttr(self, Name("strides"))
-            index = E.GetItem(strides, E.Const(0)) * indices[0]
+            strides = E.GetAttr(self, Name("estrides"))
+            index = fold(E.BinaryMultiply(E.GetItem(strides, E.Const(0)), indices[0]))
             for i, idx in enumerate(indices[1:], 1):
-                index = index + E.GetItem(strides, E.Const(i)) * idx
-            index = index / self.itemsize
-        return E.GetItem(E.GetAttr(self, "data"), index)
+                index = fold(E.BinaryAdd(index, fold(E.BinaryMultiply(E.GetItem(strides, E.Const(i)), idx))))
+        return E.ArrayItem(self, E.GetAttr(self, "data"), index)
 
     def v__len__(t, self):
         return t.shape[0]
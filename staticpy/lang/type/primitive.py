@@ -14,6 +14,30 @@ class PrimitiveType(TypeBase):
     def is_abstract(self):
         return not self.ctype
 
+    @property
+    def dtype(self):
+        """
+        The name of the numpy dtype with the same memory layout, if any.
+        """
+        if self.is_abstract() or not self.size:
+            return None
+        if self.compatible_type is bool:
+            return "bool"
+        if self.compatible_type is float:
+            return f"float{8 * self.size}"
+        return f"int{8 * self.size}"
+
+    def is_a(self, other):
+        """
+        Whether this type is `other` or derives from it, e.g. `Double.is_a(Floating)`.
+        """
+        type = self
+        while type is not None:
+            if type is other:
+                return True
+            type = type.base
+        return False
+
     def __getitem__(self, shape):
         from .derived import ArrayType
         from .. import expression as E
@@ -72,3 +96,13 @@ Void = PrimitiveType("Void", None, "void", 0)
 BuiltInType = PrimitiveType("BuiltIn", None, "", 0)
 
 AutoType = PrimitiveType("auto", None, "auto", 0)
+
+
+def from_dtype(dtype):
+    """
+    The primitive type with the memory layout of the numpy dtype named `dtype`, if any.
+    """
+    for type in (Bool, Int, Long, Float, Double):
+        if type.dtype == dtype:
+            return type
+    return None
@@ -2,6 +2,8 @@ import abc
 
 
 class Value(abc.ABC):
+    __slots__ = ("type", )
+
     def __init__(self, type=None):
         self.type = type
         if hasattr(type, "v__init__"):
@@ -16,7 +18,7 @@ class Value(abc.ABC):
             return super().__getattribute__(key)
         except AttributeError:
             name = "v_" + key
-            if "type" in self.__dict__ and self.type is not None and name in self.type.__dict__:
+            if key != "type" and self.type is not None and hasattr(self.type, name):
                 return getattr(self.type, "v_" + key)(self)
             else:
                 raise
@@ -1,4 +1,5 @@
 from .iostream import cprint, cin, cout, cerr, endl
 from .cmath import *
+from .parallel import prange
 
-from . import cmath, iostream
+from . import cmath, iostream, parallel
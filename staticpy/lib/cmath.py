@@ -1,11 +1,25 @@
+import itertools
 import math
-from ..lang import expression as E
+
+from ..lang import expression as E, type as T
 from ..lang.common import require_header
 from ..common.phase import LibFunction
 
 
-def math_function(name):
-    return LibFunction("<cmath>", getattr(math, name), name, "std")
+def math_signatures(arity):
+    """
+    The overloads of the functions of `<cmath>` taking `arity` arguments: the result
+    is a `float` if all the arguments are, and a `double` otherwise, since integral
+    arguments are taken as `double`.
+    """
+    signatures = {}
+    for types in itertools.product((T.Int, T.Long, T.Float, T.Double), repeat=arity):
+        signatures[types] = T.Float if all(type is T.Float for type in types) else T.Double
+    return signatures
+
+
+def math_function(name, arity=1, pyfunction=None):
+    return LibFunction("<cmath>", pyfunction or getattr(math, name), name, "std", math_signatures(arity))
 
 
 cos = math_function("cos")
@@ -44,7 +58,7 @@ log2 = math_function("log2")
 
 log1p = math_function("log1p")
 
-pow = math_function("pow")
+pow = math_function("pow", 2)
 
 sqrt = math_function("sqrt")
 
@@ -52,6 +66,6 @@ ceil = math_function("ceil")
 
 floor = math_function("floor")
 
-fmax = LibFunction("<cmath>", max, "fmax", "std")
+fmax = math_function("fmax", 2, max)
 
-fmin = LibFunction("<cmath>", min, "fmin", "std")
+fmin = math_function("fmin", 2, min)
@@ -0,0 +1,9 @@
+def prange(*args):
+    """
+    `range` whose iterations run in parallel when compiled.
+
+    In Python it's a plain `range`. In a jit function, the loop is compiled to an
+    OpenMP parallel loop. Variables updated in place with `+=`, `-=` or `*=` are
+    reduced across the threads.
+    """
+    return range(*args)
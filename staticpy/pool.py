@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from .common.options import get_option
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    The pool shared by background compilations.
+
+    Threads are enough here: translation is cheap and the compiler runs in its own
+    process, so the builds proceed in parallel on different cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(get_option("compile_workers") or os.cpu_count())
+        return _executor
+
+
+def submit(obj):
+    """
+    Start compiling a jit object in the background.
+    """
+    if obj._future is None and not obj._compiled:
+        obj._future = get_executor().submit(obj.compile)
+    return obj._future
+
+
+def precompile(objs, workers=None):
+    """
+    Translate, compile and load many jit objects at once.
+
+    Example
+    =======
+    ..  code-block:: python
+
+        staticpy.precompile([kernel1, kernel2, kernel3], workers=4)
+    """
+    objs = [obj for obj in objs if not obj._compiled and not obj._generic]
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        for obj in objs:
+            if obj._future is None:
+                obj._future = executor.submit(obj.compile)
+        for obj in objs:
+            obj._ensure_loaded()
+    return objs
@@ -0,0 +1,128 @@
+"""
+Libraries compiled ahead of time by `python -m staticpy build`.
+
+The build writes the libraries of a package into its `__staticpy__` directory,
+together with a manifest mapping each jit function and `# @staticpy` module to its
+library. At runtime, a jit object defined in a file under that directory loads the
+library listed in the manifest instead of translating and compiling, so no compiler
+is needed. The manifest is trusted as is: rebuild it whenever the code changes. It's
+ignored on CPUs lacking an instruction set the libraries were compiled for.
+"""
+import json
+import os
+import threading
+
+from .cache import get_version
+from .common import logging
+from .common.string import get_extension_suffix
+from .driver import get_cpu_features
+
+DIRNAME = "__staticpy__"
+MANIFEST = "manifest.json"
+
+
+def is_staticpy_module(filename):
+    """
+    Whether the file is marked with `# @staticpy` to be compiled as a whole on import.
+    """
+    with open(filename) as f:
+        line = f.readline()
+        if line[:2] == "#!":
+            line = f.readline()
+    return line == "# @staticpy\n"
+
+
+def artifact_id(root, source_path, qualname):
+    """
+    The key of a function or module in the manifest: the path of its source file
+    relative to the package root, followed by its qualified name. Modules have an
+    empty name.
+    """
+    relpath = os.path.relpath(source_path, root).replace(os.sep, "/")
+    return f"{relpath}:{qualname}"
+
+
+def write_manifest(root, libraries, march=None, cpu_features=()):
+    """
+    `libraries` maps artifact ids to (module name, file name of the library), built
+    with `-march={march}` for CPUs with `cpu_features`.
+    """
+    manifest = {
+        "version": get_version(),
+        "ext_suffix": get_extension_suffix(),
+        "march": march,
+        "cpu_features": list(cpu_features),
+        "libraries": {key: {"libname": libname, "filename": filename}
+                      for key, (libname, filename) in sorted(libraries.items())},
+    }
+    path = os.path.join(root, DIRNAME, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    with _manifests_lock:
+        _manifests.clear()
+    return path
+
+
+class Manifest:
+    def __init__(self, root, libraries):
+        self.root = root
+        self.libraries = libraries
+
+    @classmethod
+    def load(cls, root):
+        path = os.path.join(root, DIRNAME, MANIFEST)
+        with open(path) as f:
+            manifest = json.load(f)
+        ext_suffix = get_extension_suffix()
+        if manifest.get("version") != get_version() or manifest.get("ext_suffix") != ext_suffix:
+            logging.warning(f"ignoring `{path}`, built for StaticPy {manifest.get('version')} "
+                            f"and `{manifest.get('ext_suffix')}` libraries")
+            return None
+        missing = set(manifest.get("cpu_features", ())) - get_cpu_features()
+        if missing:
+            logging.warning(f"ignoring `{path}`, built with -march={manifest.get('march')} "
+                            f"for CPUs with {', '.join(sorted(missing))}")
+            return None
+        return cls(root, manifest["libraries"])
+
+    def lookup(self, source_path, qualname):
+        entry = self.libraries.get(artifact_id(self.root, source_path, qualname))
+        if entry is None:
+            return None
+        return entry["libname"], os.path.join(self.root, DIRNAME, entry["filename"])
+
+
+# {directory: the manifest of the nearest package root containing it, or None}
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def find_manifest(directory):
+    with _manifests_lock:
+        return _find_manifest(directory)
+
+
+def _find_manifest(directory):
+    if directory in _manifests:
+        return _manifests[directory]
+    manifest = None
+    if os.path.isfile(os.path.join(directory, DIRNAME, MANIFEST)):
+        manifest = Manifest.load(directory)
+    else:
+        parent = os.path.dirname(directory)
+        if parent != directory:
+            manifest = _find_manifest(parent)
+    _manifests[directory] = manifest
+    return manifest
+
+
+def find_prebuilt(source_path, qualname):
+    """
+    (module name, path) of the library built ahead of time for the function or
+    module, if any.
+    """
+    manifest = find_manifest(os.path.dirname(source_path))
+    if manifest is None:
+        return None
+    return manifest.lookup(source_path, qualname)
@@ -1,9 +1,38 @@
+from contextlib import contextmanager
+import copy
+import threading
+
+
+class Record:
+    """
+    What a translation added to its session, added again to the sessions reusing
+    the translation.
+    """
+    def __init__(self):
+        self.includes = {}
+        self.definitions = {}
+        self.openmp = False
+
+    def replay(self, session):
+        for filename in self.includes:
+            session.add_include(filename)
+        for obj in self.definitions:
+            session.add_definition(obj)
+        if self.openmp:
+            session.use_openmp()
+
+
 class Session:
     def __init__(self):
         self.blocks = {}
         self.block_stack = []
-        self.includes = set()
-        self.definitions = set()
+        # dicts are used as ordered sets, so that the generated code is the same in
+        # every process and can be looked up in the artifact cache
+        self.includes = {}
+        self.definitions = {}
+        # the generated code contains OpenMP pragmas
+        self.openmp = False
+        self._records = []
 
     @property
     def current_block(self):
@@ -16,15 +45,42 @@ class Session:
         return self.block_stack.pop()
 
     def add_include(self, filename):
-        self.includes.add(filename)
+        self.includes[filename] = None
+        for record in self._records:
+            record.includes[filename] = None
 
     def add_definition(self, obj):
-        self.definitions.add(obj)
+        self.definitions[obj] = None
+        for record in self._records:
+            record.definitions[obj] = None
+
+    def use_openmp(self):
+        self.openmp = True
+        for record in self._records:
+            record.openmp = True
+
+    @contextmanager
+    def recording(self):
+        """
+        Record what is added to the session within the block.
+        """
+        record = Record()
+        self._records.append(record)
+        try:
+            yield record
+        finally:
+            self._records.remove(record)
 
     def finalize(self):
         from .lang.common.func import get_block_or_create
         from .lang import macro as M, statement as S
         with self:
+            # reused translations add the definitions they depend on
+            blocks = {}
+            while len(blocks) < len(self.definitions):
+                for obj in list(self.definitions):
+                    if obj not in blocks:
+                        blocks[obj] = obj._translate(self)
             with get_block_or_create("header"):
                 for filename in self.includes:
                     M.include(filename)
@@ -35,30 +91,36 @@ class Session:
             main = get_block_or_create("main")
             with main:
                 for obj in self.definitions:
-                    block = obj._translate(self)
-                    for stmt in block.statements:
+                    for stmt in blocks[obj].statements:
                         if isinstance(stmt, S.BlockStatement):
-                            stmt.block.parent = main
+                            # translations are shared by sessions, each binding the
+                            # functions within its own module
+                            stmt = S.BlockStatement(copy.copy(stmt.block))
                         main.add_statement(stmt)
 
     def __enter__(self):
-        global _sessions
-        _sessions.append(self)
+        _get_sessions().append(self)
         return self
 
     def __exit__(self, *args):
-        global _sessions
-        _sessions.pop()
+        _get_sessions().pop()
+
+
+# each thread has its own stack of sessions
+_local = threading.local()
 
 
-_sessions = []
+def _get_sessions():
+    if not hasattr(_local, "sessions"):
+        _local.sessions = []
+    return _local.sessions
 
 
 def get_session() -> Session:
-    global _sessions
-    if not _sessions:
-        _sessions.append(Session())
-    return _sessions[-1]
+    sessions = _get_sessions()
+    if not sessions:
+        sessions.append(Session())
+    return sessions[-1]
 
 
 def new_session() -> Session:
@@ -1,3 +1,4 @@
+import os
 import unittest
 
 from .common.options import get_option
@@ -19,3 +20,12 @@ def enable_if_cpp_std(standards):
     def decorator(wrapped):
         return unittest.skipIf(version not in standards, "c++ std not match")(wrapped)
     return decorator
+
+
+def generated_source(fn):
+    """
+    The C++ source the compiled jit function `fn` was built from.
+    """
+    path = os.path.join(os.path.dirname(fn._target_path), fn._libname + ".cpp")
+    with open(path) as f:
+        return f.read()
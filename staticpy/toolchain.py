@@ -0,0 +1,155 @@
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import sysconfig
+import threading
+
+from .cache import default_cache_dir, get_version, make_key
+from .common.options import get_option
+from .common.profile import phase
+
+_lock = threading.RLock()
+_toolchain = None
+
+
+class Toolchain:
+    """
+    What builds need to know about the interpreter, pybind11 and the compilers.
+
+    The interpreter and pybind11 are probed in the process rather than by running
+    `python3-config` and `python3 -m pybind11`, which may not even belong to the
+    running interpreter. The probe is made once per process. With the `cache_dir`
+    option, it's also stored in the cache, keyed on the identity of the interpreter
+    and of pybind11, together with the versions of the compilers, so that later
+    processes neither probe again nor run a compiler to ask its version.
+    """
+    def __init__(self, ext_suffix, python_includes, pybind11_include, pybind11_version, compilers=None):
+        self.ext_suffix = ext_suffix
+        self.python_includes = python_includes
+        self.pybind11_include = pybind11_include
+        self.pybind11_version = pybind11_version
+        # {identity of the compiler binary: output of `--version`}
+        self.compilers = compilers or {}
+
+    @classmethod
+    def probe(cls):
+        paths = sysconfig.get_paths()
+        python_includes = [paths["include"]]
+        if paths.get("platinclude") and paths["platinclude"] not in python_includes:
+            python_includes.append(paths["platinclude"])
+        try:
+            import pybind11
+        except ImportError:
+            # enough to load prebuilt libraries
+            pybind11_include = pybind11_version = None
+        else:
+            pybind11_include, pybind11_version = pybind11.get_include(), pybind11.__version__
+        return cls(sysconfig.get_config_var("EXT_SUFFIX"), python_includes, pybind11_include, pybind11_version)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["ext_suffix"], data["python_includes"], data["pybind11_include"],
+                   data["pybind11_version"], data["compilers"])
+
+    def to_dict(self):
+        return {
+            "ext_suffix": self.ext_suffix,
+            "python_includes": self.python_includes,
+            "pybind11_include": self.pybind11_include,
+            "pybind11_version": self.pybind11_version,
+            "compilers": self.compilers,
+        }
+
+    def include_flags(self):
+        if self.pybind11_include is None:
+            raise ImportError("compiling requires pybind11")
+        return ["-I" + path for path in self.python_includes + [self.pybind11_include]]
+
+
+def interpreter_key():
+    """
+    Identifies the interpreter and the installation of pybind11 it imports.
+    """
+    spec = importlib.util.find_spec("pybind11")
+    origin = spec.origin if spec is not None else None
+    mtime = os.stat(origin).st_mtime_ns if origin else None
+    return make_key(get_version(), sys.executable, sys.version, sys.prefix, origin, mtime)
+
+
+def _persisted_path():
+    cache_dir = get_option("cache_dir") or default_cache_dir()
+    return os.path.join(cache_dir, f"toolchain.{interpreter_key()[:16]}.json")
+
+
+def _load():
+    path = _persisted_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return Toolchain.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save(toolchain):
+    path = _persisted_path()
+    if get_option("cache_readonly", False):
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(toolchain.to_dict(), f, indent=2)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+    except OSError:
+        pass
+
+
+def get_toolchain():
+    global _toolchain
+    with _lock:
+        if _toolchain is None:
+            with phase("toolchain"):
+                _toolchain = _load()
+                if _toolchain is None:
+                    _toolchain = Toolchain.probe()
+                    _save(_toolchain)
+        return _toolchain
+
+
+def reset():
+    """
+    Forget the probe of this process.
+    """
+    global _toolchain
+    with _lock:
+        _toolchain = None
+
+
+def _compiler_identity(executable):
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def compiler_version(executable, ask):
+    """
+    The version of the compiler `executable`. `ask` runs the compiler to get it,
+    unless the version of this binary is known already.
+    """
+    identity = _compiler_identity(executable)
+    toolchain = get_toolchain()
+    with _lock:
+        version = toolchain.compilers.get(identity) if identity is not None else None
+    if version is None:
+        version = ask()
+        if identity is not None:
+            with _lock:
+                toolchain.compilers[identity] = version
+                _save(toolchain)
+    return version
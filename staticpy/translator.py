@@ -6,7 +6,9 @@ import os
 import sys
 
 from .common.logging import error
+from .common.options import get_option
 from .common.phase import set_building
+from .lib.parallel import prange
 from .session import get_session, new_session
 from .lang.common.func import get_block_or_create
 from .lang import (
@@ -16,6 +18,7 @@ from .lang import (
     statement as S,
     block as B,
     macro as M,
+    optimize,
 )
 
 
@@ -70,22 +73,171 @@ class ContextStack:
         self.pop()
 
 
+class LocalsFinder:
+    """
+    Finds the locals of a function as Python does, before it's translated: the names
+    it assigns, unless they are declared `global` or `nonlocal`, even if a global or a
+    builtin has the same name. Parameters and annotated names are declared already.
+    """
+    def __init__(self, is_parallel):
+        # whether the iterable of a for loop makes it run in parallel
+        self.is_parallel = is_parallel
+        # {name: [(scopes, assignment, loop counters)]} for each use of a name, in order
+        self.uses = {}
+        self.assigned = set()
+        self.declared = set()
+        self.scopes = ()
+        self.counters = ()
+
+    def find(self, node, body, params):
+        """
+        Returns `(declarations, counters)`. `declarations` maps each local to where
+        it's declared: `(scope, assignment)`, where the scope is the function or the
+        innermost `prange` loop whose body holds all the uses of the local, so that
+        each thread has its own. It's declared by `assignment` if it's first used by a
+        plain assignment directly in the body of the scope, or at its top if that's
+        None. `counters` are the targets of for loops that aren't used outside them,
+        which each loop declares.
+        """
+        self.scopes = (node, )
+        self.statements(body, True)
+        names = self.assigned - self.declared - set(params)
+        declarations = {}
+        counters = set()
+        for name, uses in self.uses.items():
+            if name not in names:
+                continue
+            if all(name in loops for _, _, loops in uses):
+                counters.add(name)
+                continue
+            scopes = uses[0][0]
+            for other, _, _ in uses[1:]:
+                n = 0
+                while n < min(len(scopes), len(other)) and scopes[n] is other[n]:
+                    n += 1
+                scopes = scopes[:n]
+            first_scopes, assignment, _ = uses[0]
+            declarations[name] = (scopes[-1], assignment if first_scopes == scopes else None)
+        return declarations, counters
+
+    def use(self, name, assignment=None):
+        use = (self.scopes, assignment, self.counters)
+        uses = self.uses.setdefault(name, [])
+        # the uses of a name within a statement are all alike
+        if not uses or uses[-1] != use:
+            uses.append(use)
+
+    def statements(self, statements, direct):
+        for stmt in statements:
+            self.statement(stmt, direct)
+
+    def statement(self, stmt, direct):
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return
+        if isinstance(stmt, (ast.Global, ast.Nonlocal)):
+            self.declared.update(stmt.names)
+        elif isinstance(stmt, ast.Assign):
+            self.expression(stmt.value)
+            for i, target in enumerate(stmt.targets):
+                if i == 0 and isinstance(target, ast.Name):
+                    self.assigned.add(target.id)
+                    self.use(target.id, stmt if direct else None)
+                else:
+                    self.expression(target)
+        elif isinstance(stmt, ast.AugAssign):
+            if isinstance(stmt.target, ast.Name):
+                self.assigned.add(stmt.target.id)
+            self.expression(stmt.target)
+            self.expression(stmt.value)
+        elif isinstance(stmt, ast.AnnAssign):
+            if stmt.value is not None:
+                self.expression(stmt.value)
+            if isinstance(stmt.target, ast.Name):
+                self.declared.add(stmt.target.id)
+            else:
+                self.expression(stmt.target)
+        elif isinstance(stmt, ast.For):
+            self.expression(stmt.iter)
+            parallel = self.is_parallel(stmt.iter)
+            scopes, counters = self.scopes, self.counters
+            if parallel:
+                self.scopes += (stmt, )
+            if isinstance(stmt.target, ast.Name):
+                self.assigned.add(stmt.target.id)
+                self.counters += (stmt.target.id, )
+            self.expression(stmt.target)
+            self.statements(stmt.body, parallel)
+            self.scopes, self.counters = scopes, counters
+            self.statements(stmt.orelse, False)
+        elif isinstance(stmt, (ast.If, ast.While)):
+            self.expression(stmt.test)
+            self.statements(stmt.body, False)
+            self.statements(stmt.orelse, False)
+        elif isinstance(stmt, ast.With):
+            for item in stmt.items:
+                self.expression(item.context_expr)
+                if item.optional_vars is not None:
+                    self.expression(item.optional_vars)
+            self.statements(stmt.body, False)
+        else:
+            self.expression(stmt)
+
+    def expression(self, node):
+        # like `ast.walk`, which is slow on functions of many statements
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type(node) is ast.Name:
+                self.use(node.id)
+                continue
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if type(value) is list:
+                    stack.extend(child for child in value if isinstance(child, ast.AST))
+                elif isinstance(value, ast.AST):
+                    stack.append(value)
+
+
 class BaseTranslator:
-    def __init__(self, ctx={}, session=None):
+    def __init__(self, ctx={}, session=None, substitutions=None):
         self.ctx = ContextStack(ctx)
         self.sess = session
+        # types replacing the annotations of parameters, keyed by the names of the
+        # function and the parameter
+        self.substitutions = substitutions or {}
         self.source = None
         self.err_handled = False
         self.builder = ClassBuilder(self)
 
-    def translate(self, source):
+    @staticmethod
+    def parse(source):
+        """
+        Remove the indentation of the source and parse it. Returns the source and the
+        tree, which can be translated many times.
+        """
         lines = source.split("\n")
         indents = min(len(line) - len(line.lstrip()) for line in lines if line.lstrip())
-        self.source = "\n".join(line[indents:] for line in lines)
+        source = "\n".join(line[indents:] for line in lines)
+        return source, ast.parse(source)
+
+    def translate(self, source, tree=None):
+        if tree is None:
+            source, tree = self.parse(source)
+        self.source = source
         self.sess = self.sess or new_session()
         self.err_handled = False
-
-        node = ast.parse(self.source)
+        self.fast_math = get_option("fast_math", False)
+        # where the locals of the function being translated are declared, and the
+        # names of its loop counters, as found by `LocalsFinder`
+        self.declarations = {}
+        self.counters = set()
+        # {name: variable or other object} of the locals, and the types they start with
+        self.locals = {}
+        self.local_types = {}
+        # whether a local was typed after it was used, so the function is translated again
+        self.retype = False
+
+        node = tree
         with set_building():
             with self.sess:
                 return self._run_node(node)
@@ -125,6 +277,14 @@ class BaseTranslator:
             for s in res:
                 self._add_element(block, s)
 
+    @staticmethod
+    def _decorator_name(node):
+        if isinstance(node, ast.Call):
+            node = node.func
+        if isinstance(node, ast.Attribute):
+            return node.attr
+        return node.id
+
     @staticmethod
     def _try_get_doc(node):
         if isinstance(node.body[0], ast.Expr) and isinstance(node.body[0].value, ast.Str):
@@ -181,21 +341,68 @@ class BaseTranslator:
 
     def FunctionDef(self, node):
         assert isinstance(node, ast.FunctionDef)
-        decorators = set(x.id for x in node.decorator_list)
+        decorators = set(map(self._decorator_name, node.decorator_list))
         static = bool({"staticmethod", "classmethod"} & decorators)
         name = node.name
         if getattr(node, "is_method", False) and "staticmethod" not in decorators:
             args = [self._run_node(arg) for arg in node.args.args[1:]]
         else:
             args = [self._run_node(arg) for arg in node.args.args]
+            args = [self._substitute(name, arg) for arg in args]
+        for arg in args:
+            if arg.type is None:
+                raise TypeError(f"parameter `{arg.name}` of `{name}` has no type annotation")
         inputs = [(v.type, v.name) for v in args]
         returns = self._run_node(node.returns) if node.returns is not None else T.Void
 
         new_env = {v.name: v for v in args}
         doc, body = self._try_get_doc(node)
-        block = B.Function(name, inputs, returns, None, static=static, doc=doc)
-        block = self._run_nodes(body, new_env, block)
-        return block
+        outer = self.declarations, self.counters, self.locals, self.local_types
+        finder = LocalsFinder(self._is_parallel)
+        self.declarations, self.counters = finder.find(node, body, new_env)
+        self.local_types = {}
+        try:
+            while True:
+                self.locals = {name: V.Variable(name, self.local_types.get(name)) for name in self.declarations}
+                self.retype = False
+                block = B.Function(name, inputs, returns, None, static=static, doc=doc)
+                block = self._run_nodes(body, new_env, block)
+                self._declare_locals(block, node)
+                if not self.retype:
+                    break
+                # translated again with the types the locals end up with, so that the
+                # expressions using them are typed alike. `auto` may come from the uses
+                # of locals that weren't typed yet, so those are typed again.
+                self.local_types = {name: value.type if isinstance(value, V.Variable) and value.type is not T.AutoType
+                                    else None for name, value in self.locals.items()}
+        finally:
+            self.declarations, self.counters, self.locals, self.local_types = outer
+        return optimize.optimize(block)
+
+    def _declare_locals(self, block, scope):
+        """
+        Declare the locals of `scope` that aren't declared by their first assignment at
+        the top of its block.
+        """
+        declarations = []
+        for name, (where, assignment) in self.declarations.items():
+            variable = self.locals[name]
+            if where is not scope or assignment is not None or not isinstance(variable, V.Variable):
+                continue
+            if variable.type is None:
+                if self.retype:
+                    # typed when the function is translated again
+                    continue
+                raise TypeError(f"can't infer the type of `{name}` from the values assigned to it, "
+                                f"annotate it, as in `{name}: Double`")
+            declarations.append(S.VariableDeclaration(variable))
+        block.statements[:0] = declarations
+
+    def _substitute(self, function, variable):
+        type = self.substitutions.get((function, variable.name))
+        if type is None:
+            return variable
+        return V.Variable(variable.name, type)
 
     def Constructor(self, name, node):
         """
@@ -258,8 +465,7 @@ class BaseTranslator:
         return block
 
     def For(self, node):
-        if node.iter.func.id != "range":
-            raise SyntaxError("Only support for-range")
+        parallel = self._is_prange(node.iter)
         args = [self._run_node(x) for x in node.iter.args]
         if len(args) == 1:
             start, stop, step = 0, args[0], 1
@@ -267,35 +473,103 @@ class BaseTranslator:
             start, stop, step = args[0], args[1], 1
         else:
             start, stop, step = args
-        try:
-            target = self._run_node(node.target)
-            declare = False
-            env = {}
-        except NameError:
-            if isinstance(node.target, ast.Name):
-                type = self._determine_type(start, stop)
-                target = V.Variable(node.target.id, type)
+        name = node.target.id if isinstance(node.target, ast.Name) else None
+        declare = name in self.counters
+        if not declare:
+            try:
+                target = self._run_node(node.target)
+            except NameError:
+                if name is None:
+                    raise
                 declare = True
-                env = {node.target.id: target}
-            else:
-                raise
-        return self._run_nodes(node.body, env, block=B.For(target, start, stop, step, None, declare))
+        if declare:
+            type = self._determine_type(start, stop, step)
+            target = V.Variable(name, type)
+            env = {name: target}
+        else:
+            env = {}
+            if self.locals.get(name) is target:
+                self._infer(target, start, stop, step, type=self._determine_type(start, stop, step))
+        if not parallel:
+            return self._run_nodes(node.body, env, block=B.For(target, start, stop, step, None, declare))
+        block = self._run_nodes(node.body, env, block=B.ParallelFor(target, start, stop, step, None, declare))
+        self._declare_locals(block, node)
+        block.private, block.reductions = self._find_shared(block)
+        self.sess.use_openmp()
+        return block
+
+    def _is_parallel(self, node):
+        """
+        Whether a for loop over `node` runs in parallel, before it's translated.
+        """
+        try:
+            return self._is_prange(node)
+        except SyntaxError:
+            # reported when the loop is translated
+            return False
+
+    def _is_prange(self, node):
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name) and node.func.id == "range":
+                return False
+            try:
+                func = self._run_node(node.func)
+            except NameError:
+                func = None
+            if func is range:
+                return False
+            if func is prange:
+                return True
+        raise SyntaxError("Only support for-range")
 
     @staticmethod
-    def _determine_type(start, end):
-        int_limit = 1 << 31
-        if isinstance(start, ast.Num):
-            start = start.n
-        if isinstance(end, ast.Num):
-            end = end.n
-        if (
-                (isinstance(start, V.Variable) and start.type is T.Long) or
-                (isinstance(end, V.Variable) and end.type is T.Long) or
-                (isinstance(start, int) and not -int_limit < start < int_limit) or
-                (isinstance(end, int) and not -int_limit < end < int_limit)):
-            return T.Long
-        else:
-            return T.Int
+    def _find_shared(block):
+        """
+        (private, reductions) of the variables of the enclosing scopes used in the loop
+        body: the counters of the inner loops, which each thread keeps to itself, and
+        the variables updated in place, which are combined across the threads.
+        """
+        operators = {S.InplaceAdd: "+", S.InplaceSubtract: "-", S.InplaceMultiply: "*"}
+        declared = set()
+        assigned = set()
+        counters = []
+        reductions = {}
+
+        def visit(statements):
+            for stmt in statements:
+                if isinstance(stmt, S.VariableDeclaration):
+                    declared.add(stmt.variable.name)
+                elif isinstance(stmt, S.BlockStatement):
+                    if isinstance(stmt.block, B.For):
+                        if stmt.block.declare:
+                            declared.add(stmt.block.variable.name)
+                        elif stmt.block.variable.name not in counters:
+                            counters.append(stmt.block.variable.name)
+                    visit(stmt.block.statements)
+                elif isinstance(stmt, S.Assign) and isinstance(stmt.target, V.Variable):
+                    assigned.add(stmt.target.name)
+                elif isinstance(getattr(stmt, "target", None), V.Variable) and hasattr(stmt, "op"):
+                    name = stmt.target.name
+                    if type(stmt) not in operators:
+                        raise SyntaxError(f"`{name} {stmt.op}` can't be reduced in a parallel loop")
+                    reductions.setdefault(name, operators[type(stmt)])
+
+        visit(block.statements)
+        shared = assigned - declared
+        if shared:
+            raise SyntaxError(f"`{min(shared)}` of the enclosing scope can't be assigned in a parallel loop")
+        private = [name for name in counters if name not in declared]
+        return private, [(op, name) for name, op in reductions.items() if name not in declared]
+
+    @staticmethod
+    def _determine_type(*bounds):
+        """
+        The narrowest type a loop counter over the bounds can have: `int`, unless a
+        bound is a `long`, or a constant that doesn't fit in an `int`. Narrower types
+        are promoted to `int` anyway.
+        """
+        type = E.arithmetic_type(*map(E.cast_value_to_expression, bounds))
+        return T.Long if type is T.Long else T.Int
 
     # ============= statements =============
     def Import(self, node):
@@ -324,8 +598,15 @@ class BaseTranslator:
         return S.ReturnValue(value)
 
     def Assign(self, node):
-        target = self._run_node(node.targets[0])
         value = self._run_node(node.value)
+        if isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in self.declarations:
+                return self._assign_local(node, name, value)
+            if not self._is_defined(name):
+                return self._declare(name, value)
+        target = self._run_node(node.targets[0])
+        self._check_writable(target)
         return S.Assign(target, value)
 
     def AugAssign(self, node):
@@ -336,10 +617,82 @@ class BaseTranslator:
             ast.Div: S.InplaceDivide,
         }
         target = self._run_node(node.target)
+        self._check_writable(target)
         op = type(node.op)
         value = self._run_node(node.value)
+        if isinstance(node.target, ast.Name) and self.locals.get(node.target.id) is target:
+            self._infer(target, value)
         return op_map[op](target, value)
 
+    def _is_defined(self, name):
+        try:
+            self.ctx[name]
+        except KeyError:
+            return False
+        return True
+
+    def _assign_local(self, node, name, value):
+        """
+        Assign `value` to a local of the function, declared by this assignment or at
+        the top of its scope. Other objects, such as types and modules, are only given
+        the name.
+        """
+        if not isinstance(value, (V.Value, bool, int, float, str)):
+            self.locals[name] = value
+            return None
+        variable = self.locals[name]
+        if not isinstance(variable, V.Variable):
+            raise TypeError(f"`{name}` is {variable!r} and can't be assigned a value")
+        value = E.cast_value_to_expression(value)
+        declared = self.declarations[name][1] is node
+        self._infer(variable, value, auto=declared)
+        if declared:
+            return S.VariableDeclaration(variable, value)
+        return S.Assign(variable, value)
+
+    def _declare(self, name, value):
+        """
+        Declare the variable `name`, assigned `value` outside a function.
+        """
+        if not isinstance(value, (V.Value, bool, int, float, str)):
+            self.ctx[name] = value
+            return None
+        value = E.cast_value_to_expression(value)
+        variable = V.Variable(name, None)
+        self._infer(variable, value)
+        self.ctx[name] = variable
+        return S.VariableDeclaration(variable, value)
+
+    def _infer(self, variable, *values, type=None, auto=True):
+        """
+        Type a variable declared without annotation by the values assigned to it. It
+        takes the type of the first whose type is known. Otherwise it's `auto` if
+        it's declared by this assignment, with `auto`, and left untyped if not, to be
+        typed by the other assignments. A variable typed as an integer takes a wider
+        type if it's assigned one, as in Python, while a floating variable keeps its
+        precision. `type` is that of the values, if given.
+        """
+        values = [E.cast_value_to_expression(value) for value in values]
+        if variable.type is None:
+            if type is None:
+                type = E.operand_type(values[0])
+            if not isinstance(type, T.TypeBase) or (isinstance(type, T.PrimitiveType) and
+                                                    (type.is_abstract() or type is T.Void)):
+                if not auto:
+                    return
+                type = T.AutoType
+            variable.type = type
+        elif isinstance(variable.type, T.PrimitiveType) and variable.type.is_a(T.Integral):
+            type = E.arithmetic_type(variable, *values)
+            if type is not None and type is not variable.type:
+                variable.type = type
+                self.retype = True
+
+    @staticmethod
+    def _check_writable(target):
+        if isinstance(target, E.ArrayItem) and not target.array.type.mutable:
+            raise TypeError(f"array `{target.array}` is read-only, declare it with a `.mut` type such as `Double[:].mut`")
+
     def AnnAssign(self, node):
         if isinstance(node.target, ast.Attribute):
             varname = node.target.attr
@@ -370,6 +723,12 @@ class BaseTranslator:
     def Name(self, node):
         ctx = self.ctx
         name = node.id
+        if name in self.locals:
+            value = self.locals[name]
+            if isinstance(value, V.Variable) and value.type is None and name not in self.local_types:
+                # used before the assignment typing it, as in a loop
+                self.retype = True
+            return value
         try:
             return ctx[name]
         except KeyError as e:
@@ -431,7 +790,7 @@ class BaseTranslator:
             ast.Not: E.UnaryNot,
         }
         op = op_map[type(node.op)]
-        return op(self._run_node(node.operand))
+        return optimize.fold(op(self._run_node(node.operand)))
 
     def BinOp(self, node):
         op_map = {
@@ -449,7 +808,7 @@ class BaseTranslator:
         op = op_map[type(node.op)]
         left = self._run_node(node.left)
         right = self._run_node(node.right)
-        return op(left, right)
+        return optimize.fold(op(left, right), self.fast_math)
 
     def BoolOp(self, node):
         op_map = {
@@ -488,6 +847,9 @@ class BaseTranslator:
 
     # ============= others =============
     def arg(self, node):
+        if node.annotation is None:
+            # only valid when the type is substituted
+            return V.Variable(node.arg, None)
         return V.Variable(node.arg, self._run_node(node.annotation))
 
 
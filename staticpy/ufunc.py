@@ -0,0 +1,154 @@
+import inspect
+
+from .common.phase import TwoPhaseFunction
+from .jit import JitObject, _jit
+from .lang import (
+    block as B,
+    statement as S,
+    expression as E,
+    type as T,
+    variable as V,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class VectorizedObject(JitObject):
+    """
+    A scalar jit function applied elementwise to arrays broadcast against each other.
+
+    Besides the scalar function, the library contains a kernel looping over the
+    buffers of the output and the inputs, which are broadcast in Python by numpy.
+    """
+    # calls go through `normal` to broadcast the arguments
+    __call__ = TwoPhaseFunction.__call__
+
+    def __init__(self, name, obj, env={}, **options):
+        super().__init__(name, obj, env, **options)
+        self._kernel = None
+        self._input_dtypes = None
+        self._output_dtype = None
+
+    @property
+    def kernel_name(self):
+        return self.name + "__vectorized"
+
+    def normal(self, *args, out=None):
+        if np is None:
+            raise ImportError("vectorize requires numpy")
+        if not self._compiled:
+            self._ensure_loaded()
+        if len(args) != len(self._input_dtypes):
+            raise TypeError(f"{self.name}() takes {len(self._input_dtypes)} arguments but {len(args)} were given")
+        arrays = [self._cast(np.asarray(arg), np.dtype(dtype)) for arg, dtype in zip(args, self._input_dtypes)]
+        if out is None:
+            arrays = np.broadcast_arrays(*arrays)
+            result = np.empty(arrays[0].shape if arrays else (), self._output_dtype)
+        else:
+            if out.dtype != self._output_dtype:
+                raise TypeError(f"{self.name}() requires an output of type {self._output_dtype}, got {out.dtype}")
+            arrays = [np.broadcast_to(array, out.shape) for array in arrays]
+            result = out
+        self._kernel(result, *arrays)
+        if out is None and result.ndim == 0:
+            return result[()]
+        return result
+
+    def _cast(self, array, dtype):
+        """
+        `array` converted to `dtype`. Integers are narrowed only when all of them fit,
+        like the int64 arrays numpy makes of Python ints, passed to `Int` arguments.
+        """
+        if np.can_cast(array.dtype, dtype, casting="safe"):
+            return array.astype(dtype, copy=False)
+        result = array.astype(dtype, casting="same_kind", copy=False)
+        if dtype.kind in "iu" and not np.array_equal(result, array):
+            raise TypeError(f"{self.name}() got values out of the range of {dtype}")
+        return result
+
+    def _load_from(self, library):
+        super()._load_from(library)
+        self._kernel = getattr(library, self.kernel_name)
+
+    def _translate_tree(self, sess, source, tree):
+        block = super()._translate_tree(sess, source, tree)
+        function = next(stmt.block for stmt in block.statements
+                        if isinstance(stmt, S.BlockStatement) and getattr(stmt.block, "name", None) == self.name)
+        for type, name in function.inputs:
+            if getattr(type, "dtype", None) is None:
+                raise TypeError(f"argument `{name}` of vectorized function `{self.name}` must be a primitive type")
+        if getattr(function.output, "dtype", None) is None:
+            raise TypeError(f"vectorized function `{self.name}` must return a primitive type")
+        self._input_dtypes = [type.dtype for type, _ in function.inputs]
+        self._output_dtype = function.output.dtype
+        sess.add_include("<ufunc.h>")
+        kernel = self._kernel_block(sess, function)
+        with sess:
+            with block:
+                block.add_statement(S.BlockStatement(kernel))
+        return block
+
+    def _kernel_block(self, sess, function):
+        """
+        void name__vectorized(py::buffer buffer_0, py::buffer buffer_1, ...)
+
+        `buffer_0` is the output and the others are the inputs, all of the same shape.
+        """
+        buffer_t = T.OtherType(E.ScopeAnalysis(V.Name("py"), V.Name("buffer")))
+        types = [function.output] + [type for type, _ in function.inputs]
+        buffers = [V.Variable(f"buffer_{i}", buffer_t) for i in range(len(types))]
+        kernel = B.Function(self.kernel_name, [(buffer_t, buffer.name) for buffer in buffers], T.Void, None)
+        with sess:
+            with kernel:
+                infos = []
+                for i, buffer in enumerate(buffers):
+                    info = V.Variable(f"buffer_info_{i}", T.AutoType)
+                    if i == 0:
+                        request = E.CallFunction("request_writable", (buffer, E.Const("out")))
+                    else:
+                        request = E.CallFunction(E.GetAttr(buffer, "request"), ())
+                    S.declare(info, request)
+                    infos.append(info)
+                S.statement(f"StridedLoop loop({{{', '.join('&' + info.name for info in infos)}}});")
+                if self.nogil:
+                    S.statement("py::gil_scoped_release _release;")
+                rows = B.While(V.Name("loop.next()"), None)
+                with rows:
+                    i = V.Variable("i", T.Long)
+                    row = B.For(i, 0, V.Name("loop.size"), 1, None, declare=True)
+                    with row:
+                        def element(k):
+                            return V.Name(f"*({types[k].cname()}*)(loop.data[{k}] + {i} * loop.strides[{k}])")
+
+                        args = tuple(element(k) for k in range(1, len(types)))
+                        S.assign(element(0), E.CallFunction(V.Name(self.name), args))
+                    rows.add_statement(S.BlockStatement(row))
+                kernel.add_statement(S.BlockStatement(rows))
+        return kernel
+
+
+def vectorize(obj=None, **options):
+    """
+    Compile a scalar function into a function applied elementwise to numpy arrays.
+
+    The arguments are broadcast against each other like those of a numpy ufunc, and
+    the result is written into a new array, or into the array given as `out`. Takes
+    the same options as `jit`.
+
+    Example
+    =======
+    ..  code-block:: python
+
+        @vectorize
+        def clip(x: Double, limit: Double) -> Double:
+            return x if x < limit else limit
+
+        clip(np.arange(10.0), 5.0)
+    """
+    frame = inspect.currentframe().f_back
+    if obj is None:
+        return lambda obj: _jit(obj, frame, cls=VectorizedObject, **options)
+    return _jit(obj, frame, cls=VectorizedObject, **options)
@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from staticpy.common.options import get_option, set_option
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_dir():
+    """
+    Build the libraries of the tests into a temporary cache rather than the user's,
+    in this process and in the ones it starts.
+    """
+    path = tempfile.mkdtemp()
+    option, env = get_option("cache_dir"), os.environ.get("STATICPY_CACHE_DIR")
+    set_option("cache_dir", path)
+    os.environ["STATICPY_CACHE_DIR"] = path
+    yield path
+    set_option("cache_dir", option)
+    if env is None:
+        del os.environ["STATICPY_CACHE_DIR"]
+    else:
+        os.environ["STATICPY_CACHE_DIR"] = env
+    shutil.rmtree(path, ignore_errors=True)
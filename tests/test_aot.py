@@ -0,0 +1,76 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from staticpy.prebuilt import DIRNAME, Manifest, write_manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class AotTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        package = os.path.join(self.path, "aotpkg")
+        os.makedirs(os.path.join(package, "sub"))
+        self.files = {
+            "__init__.py": "",
+            "kernels.py": """
+                from staticpy import jit, Long
+
+                @jit
+                def square(n: Long) -> Long:
+                    return n * n
+            """,
+            "sub/__init__.py": "",
+            "sub/whole.py": """
+                # @staticpy
+                def triple(x: int) -> int:
+                    return x * 3
+            """,
+        }
+        for name, source in self.files.items():
+            with open(os.path.join(package, name), "w") as f:
+                f.write(textwrap.dedent(source).lstrip())
+        self.package = package
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_python(self, *args):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, self.path]),
+                   STATICPY_CACHE_DIR=os.path.join(self.path, "cache"))
+        return subprocess.run([sys.executable, *args], cwd=self.path, env=env, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+    def test_build(self):
+        self.run_python("-m", "staticpy", "build", self.package)
+        with open(os.path.join(self.package, "__staticpy__", "manifest.json")) as f:
+            manifest = json.load(f)
+        self.assertEqual(sorted(manifest["libraries"]), ["kernels.py:square", "sub/whole.py:"])
+        if platform.machine().lower() in ("x86_64", "amd64"):
+            self.assertEqual(manifest["march"], "x86-64")
+            self.assertEqual(manifest["cpu_features"], [])
+        # the libraries are loaded without compiler
+        shutil.rmtree(os.path.join(self.path, "cache"))
+        output = self.run_python("-c", textwrap.dedent("""
+            import staticpy.hook
+            from staticpy.common.options import set_option
+            set_option("compiler", "/nonexistent/c++")
+            from aotpkg.kernels import square
+            from aotpkg.sub import whole
+            print(square(7), whole.triple(3))
+        """)).stdout
+        self.assertEqual(output.split()[-2:], ["49", "9"])
+
+    def test_missing_cpu_features(self):
+        os.makedirs(os.path.join(self.package, DIRNAME))
+        write_manifest(self.package, {}, "x86-64", [])
+        self.assertIsNotNone(Manifest.load(self.package))
+        write_manifest(self.package, {}, "future", ["staticpy_no_such_feature"])
+        self.assertIsNone(Manifest.load(self.package))
@@ -2,7 +2,9 @@ import unittest
 
 import numpy as np
 
-from staticpy import jit, Int
+from staticpy import jit, Int, Double
+from staticpy.common.options import set_option
+from staticpy.testing import generated_source
 
 
 class TestArray(unittest.TestCase):
@@ -33,3 +35,113 @@ class TestArray(unittest.TestCase):
     def test_skip_array(self):
         x = self.x[2:, :]
         self.assertEqual(self.fn(x), x[:, 0].sum())
+
+    def test_wrong_dimensions(self):
+        with self.assertRaises(ValueError):
+            self.fn(np.arange(10, dtype=np.int32))
+
+
+class TestReturnArray(unittest.TestCase):
+    def test_empty(self):
+        def fn_return_empty(n: Int, m: Int) -> Double[:, :]:
+            i: Int
+            j: Int
+            out: Double[:, :].mut = Double[:, :].empty(n, m)
+            for i in range(n):
+                for j in range(m):
+                    out[i, j] = i * 10 + j
+            return out
+
+        expected = np.arange(3)[:, None] * 10.0 + np.arange(4)
+        result = jit(fn_return_empty)(3, 4)
+        np.testing.assert_array_equal(result, expected)
+        # the memory is owned by the capsule handed over to numpy
+        self.assertFalse(result.flags.owndata)
+        self.assertIsNotNone(result.base)
+        np.testing.assert_array_equal(fn_return_empty(3, 4), expected)
+
+    def test_return_parameter(self):
+        @jit
+        def fn_return_parameter(x: Double[:]) -> Double[:]:
+            return x
+
+        x = np.arange(6.0)[::-2]
+        result = fn_return_parameter(x)
+        np.testing.assert_array_equal(result, x)
+        self.assertFalse(np.shares_memory(result, x))
+
+
+class TestWritableArray(unittest.TestCase):
+    def setUp(self):
+        @jit
+        def fn_scale(x: Double[:, :].mut, factor: Double):
+            i: Int
+            j: Int
+            for i in range(x.shape[0]):
+                for j in range(x.shape[1]):
+                    x[i, j] *= factor
+        self.fn = fn_scale
+
+    def test_in_place(self):
+        x = np.arange(12.0).reshape(3, 4)
+        self.fn(x[:, ::2], 2.0)
+        expected = np.arange(12.0).reshape(3, 4)
+        expected[:, ::2] *= 2
+        np.testing.assert_array_equal(x, expected)
+
+    def test_read_only(self):
+        x = np.arange(4.0).reshape(2, 2)
+        x.setflags(write=False)
+        with self.assertRaisesRegex(ValueError, "writable"):
+            self.fn(x, 2.0)
+
+    def test_assign_to_read_only(self):
+        @jit
+        def fn_write_read_only(x: Double[:]):
+            x[0] = 1.0
+
+        with self.assertRaises(TypeError):
+            fn_write_read_only(np.zeros(1))
+
+
+class TestContiguousVariant(unittest.TestCase):
+    def setUp(self):
+        def fn_weighted_sum(x: Double[:, :, :]) -> Double:
+            s: Double = 0
+            i: Int
+            j: Int
+            k: Int
+            for i in range(x.shape[0]):
+                for j in range(x.shape[1]):
+                    for k in range(x.shape[2]):
+                        s += x[i, j, k] * (i + 2 * j + 3 * k)
+            return s
+        self.fn = fn_weighted_sum
+        self.x = np.arange(60.0).reshape(3, 4, 5)
+
+    def expected(self, x):
+        return (x * np.fromfunction(lambda i, j, k: i + 2 * j + 3 * k, x.shape)).sum()
+
+    def test_dispatch(self):
+        fn = jit(self.fn)
+        self.assertEqual(fn(self.x), self.expected(self.x))
+        y = self.x[::-1, ::2, 1:]
+        self.assertEqual(fn(y), self.expected(y))
+        self.assertIn("fn_weighted_sum__contiguous(_x)", generated_source(fn))
+
+    def test_disabled(self):
+        set_option("contiguous_variant", False)
+        try:
+            fn = jit(self.fn)
+            y = self.x[:, 1:, :]
+            self.assertEqual(fn(y), self.expected(y))
+            self.assertNotIn("__contiguous", generated_source(fn))
+        finally:
+            set_option("contiguous_variant", True)
+
+    def test_continuous_annotation(self):
+        @jit
+        def fn_continuous(x: Double[2, 3, 4, True]) -> Double:
+            return x[1, 2, 3]
+
+        self.assertEqual(fn_continuous(np.arange(24.0).reshape(2, 3, 4)), 23.0)
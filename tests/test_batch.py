@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from staticpy import jit, Int
+from staticpy.compiler import Compiler
+from staticpy.jit import build_library
+from staticpy.common.options import set_option
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        set_option("batch_module", True)
+
+    def tearDown(self):
+        set_option("batch_module", False)
+
+    def test_single_library(self):
+        @jit
+        def fn_batch_add(a: Int, b: Int) -> Int:
+            return a + b
+
+        @jit
+        def fn_batch_sub(a: Int, b: Int) -> Int:
+            return a - b
+
+        self.assertIs(fn_batch_add._module, fn_batch_sub._module)
+        self.assertEqual(fn_batch_add(1, 2), 3)
+        with mock.patch.object(Compiler, "compile") as compile:
+            self.assertEqual(fn_batch_sub(1, 2), -1)
+        compile.assert_not_called()
+
+    def test_redefinition(self):
+        @jit
+        def fn_batch_redefined() -> Int:
+            return 1
+        first = fn_batch_redefined
+
+        @jit
+        def fn_batch_redefined() -> Int:
+            return 2
+
+        self.assertIsNone(first._module)
+        self.assertEqual(first(), 1)
+        self.assertEqual(fn_batch_redefined(), 2)
+
+    def test_background_compile(self):
+        set_option("background_compile", True)
+        try:
+            with mock.patch("staticpy.jit.build_library", wraps=build_library) as build:
+                @jit
+                def fn_batch_first(a: Int) -> Int:
+                    return a + 1
+
+                @jit
+                def fn_batch_second(a: Int) -> Int:
+                    return a + 2
+
+                self.assertIsNone(fn_batch_first._future)
+                self.assertEqual(fn_batch_first(1), 2)
+                self.assertEqual(fn_batch_second(1), 3)
+        finally:
+            set_option("background_compile", False)
+        self.assertEqual(build.call_count, 1)
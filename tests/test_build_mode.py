@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from staticpy import jit, Int
+from staticpy.common.options import get_option, set_option
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BuildModeTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = get_option("cache_dir")
+        self.root = tempfile.mkdtemp()
+        set_option("cache_dir", self.root)
+
+    def tearDown(self):
+        set_option("build_mode", "release")
+        set_option("cache_dir", self.cache_dir)
+        shutil.rmtree(self.root)
+
+    def test_lto(self):
+        set_option("build_mode", "lto")
+
+        @jit
+        def fn_lto(n: Int) -> Int:
+            return n * 5
+
+        self.assertEqual(fn_lto(2), 10)
+
+    def test_pgo(self):
+        set_option("build_mode", "pgo")
+        calls = []
+
+        def training(fn):
+            calls.append(fn)
+            for i in range(100):
+                fn(i)
+
+        def fn_pgo(n: Int) -> Int:
+            s: Int = 0
+            i: Int
+            for i in range(n):
+                if i % 3 == 0:
+                    s += i
+            return s
+
+        first = jit(training=training)(fn_pgo)
+        self.assertEqual(first(10), 18)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(os.path.exists(os.path.dirname(first._target_path) + ".profile"))
+
+        second = jit(training=training)(fn_pgo)
+        self.assertEqual(second(10), 18)
+        self.assertEqual(len(calls), 1)
+
+    def test_profile_not_rewritten_at_exit(self):
+        script = textwrap.dedent("""
+            import os, sys
+            from staticpy import jit, Int
+            from staticpy.common.options import set_option
+            set_option("cache_dir", sys.argv[1])
+            set_option("build_mode", "pgo")
+
+            def training(fn):
+                for i in range(100):
+                    fn(i)
+
+            @jit(training=training)
+            def fn_pgo_exit(n: Int) -> Int:
+                return n * 3
+
+            assert fn_pgo_exit(2) == 6
+            for dirpath, _, filenames in os.walk(sys.argv[1]):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    print("mtime", os.stat(path).st_mtime_ns, path)
+        """)
+        filename = os.path.join(self.root, "pgo_exit.py")
+        with open(filename, "w") as f:
+            f.write(script)
+        cache_dir = os.path.join(self.root, "cache")
+        output = subprocess.run([sys.executable, filename, cache_dir], check=True, stdout=subprocess.PIPE,
+                                env=dict(os.environ, PYTHONPATH=ROOT), universal_newlines=True).stdout
+        files = {path: mtime for _, mtime, path in
+                 (line.split(" ", 2) for line in output.splitlines() if line.startswith("mtime "))}
+        self.assertTrue(any(".profile" in path for path in files))
+        after = {os.path.join(dirpath, filename) for dirpath, _, filenames in os.walk(cache_dir) for filename in filenames}
+        self.assertEqual(after, set(files))
+        for path, mtime in files.items():
+            self.assertEqual(os.stat(path).st_mtime_ns, int(mtime), path)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from staticpy import jit, Int
+from staticpy.cache import ArtifactCache
+from staticpy.compiler import Compiler
+from staticpy.common.options import get_option, set_option
+
+
+class CacheTest(unittest.TestCase):
+    def test_reuse_unchanged_code(self):
+        def fn_cached(n: Int) -> Int:
+            return n + 1
+
+        first = jit(fn_cached)
+        self.assertEqual(first(1), 2)
+        second = jit(fn_cached)
+        with mock.patch.object(Compiler, "compile") as compile:
+            self.assertEqual(second(2), 3)
+        compile.assert_not_called()
+        self.assertEqual(first._target_path, second._target_path)
+
+    def test_rebuild_changed_code(self):
+        def fn_changed(n: Int) -> Int:
+            return n + 1
+        first = jit(fn_changed)
+        first.compile()
+
+        def fn_changed(n: Int) -> Int:
+            return n + 2
+        second = jit(fn_changed)
+        second.compile()
+        self.assertNotEqual(first._target_path, second._target_path)
+        self.assertEqual(second(1), 3)
+
+
+class SharedCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = get_option("cache_dir")
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        set_option("cache_dir", self.cache_dir)
+        set_option("cache_readonly", False)
+        shutil.rmtree(self.root)
+
+    def test_publish(self):
+        cache = ArtifactCache(self.root)
+        with cache.lock("abc", "lib"):
+            with cache.staging("abc", "lib") as staging:
+                with open(os.path.join(staging, "lib.so"), "w") as f:
+                    f.write("")
+        self.assertEqual(cache.lookup("abc", "lib", ".so"), cache.artifact_path("abc", "lib", ".so"))
+
+    def test_failed_build_is_not_published(self):
+        cache = ArtifactCache(self.root)
+        with self.assertRaises(ValueError):
+            with cache.staging("abc", "lib"):
+                raise ValueError
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_cache_dir(self):
+        set_option("cache_dir", self.root)
+
+        @jit
+        def fn_shared(n: Int) -> Int:
+            return n * 2
+
+        self.assertEqual(fn_shared(2), 4)
+        self.assertTrue(fn_shared._target_path.startswith(self.root))
+
+    def test_default_cache_dir(self):
+        set_option("cache_dir", None)
+        set_option("precompiled_header", False)
+
+        @jit
+        def fn_user_cache(n: Int) -> Int:
+            return n * 5
+
+        try:
+            with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.root}):
+                self.assertEqual(fn_user_cache(2), 10)
+        finally:
+            set_option("precompiled_header", True)
+        self.assertTrue(fn_user_cache._target_path.startswith(os.path.join(self.root, "staticpy")))
+
+    def test_readonly(self):
+        set_option("cache_dir", self.root)
+        set_option("cache_readonly", True)
+
+        def fn_readonly(n: Int) -> Int:
+            return n * 3
+
+        first = jit(fn_readonly)
+        self.assertEqual(first(2), 6)
+        self.assertEqual(os.listdir(self.root), [])
+        # built privately once per process
+        second = jit(fn_readonly)
+        with mock.patch.object(Compiler, "compile") as compile:
+            self.assertEqual(second(2), 6)
+        compile.assert_not_called()
+        self.assertEqual(first._target_path, second._target_path)
+
+    def test_precompiled_header(self):
+        set_option("cache_dir", self.root)
+
+        @jit
+        def fn_prelude(n: Int) -> Int:
+            return n * 4
+
+        self.assertEqual(fn_prelude(2), 8)
+        prelude = [name for name in os.listdir(self.root) if name.startswith(Compiler.prelude_name + ".")]
+        self.assertEqual(len([name for name in prelude if not name.endswith(".lock")]), 1)
@@ -0,0 +1,41 @@
+import unittest
+
+from staticpy import jit, Long
+from staticpy.common.options import set_option
+
+
+@jit
+def call_square(n: Long) -> Long:
+    return n * n
+
+
+class CallTest(unittest.TestCase):
+    def setUp(self):
+        self.call_square = call_square
+
+    def tearDown(self):
+        set_option("replace_global", False)
+        globals()["call_square"] = self.call_square
+
+    def test_compiled(self):
+        @jit
+        def call_compiled(n: Long) -> Long:
+            return n + 1
+
+        compiled = call_compiled.compiled
+        self.assertEqual(type(compiled).__name__, "builtin_function_or_method")
+        self.assertEqual(compiled(1), 2)
+        self.assertEqual(call_compiled(1), 2)
+
+    def test_replace_global(self):
+        set_option("replace_global", True)
+        jit_obj = call_square
+        self.assertEqual(call_square(3), 9)
+        self.assertIs(globals()["call_square"], jit_obj.compiled)
+
+        # a function defined later still translates the call
+        @jit
+        def call_replaced(n: Long) -> Long:
+            return call_square(n) + 1
+
+        self.assertEqual(call_replaced(3), 10)
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from staticpy import jit, Floating, Double, Long
+
+
+@jit
+def dispatch_total(x: Floating[:]) -> Double:
+    s: Double = 0
+    i: Long
+    for i in range(x.shape[0]):
+        s += x[i]
+    return s
+
+
+@jit
+def dispatch_scale(x: Floating[:].mut, factor: Floating):
+    i: Long
+    for i in range(x.shape[0]):
+        x[i] *= factor
+
+
+@jit
+def dispatch_untyped(n) -> Double:
+    return n * 2
+
+
+@jit
+def dispatch_caller(x: Double[:]) -> Double:
+    return dispatch_total(x) * 2
+
+
+class DispatchTest(unittest.TestCase):
+    def test_specialise_per_dtype(self):
+        self.assertEqual(dispatch_total(np.arange(5.0)), 10.0)
+        self.assertEqual(dispatch_total(np.arange(5, dtype=np.float32)), 10.0)
+        self.assertEqual(dispatch_total(np.arange(10.0)[::2]), 20.0)
+        self.assertIn("dispatch_total__double1d", dispatch_total._specialisations)
+        self.assertIn("dispatch_total__float1d", dispatch_total._specialisations)
+        self.assertIn(((np.dtype("float32"), 1), ), dispatch_total._signatures)
+
+    def test_keeps_dtype(self):
+        x = np.ones(3, dtype=np.float32)
+        dispatch_scale(x, np.float32(3))
+        self.assertEqual(x.tolist(), [3, 3, 3])
+        self.assertEqual(list(dispatch_scale._specialisations), ["dispatch_scale__float1d__float"])
+
+    def test_unannotated(self):
+        self.assertEqual(dispatch_untyped(3), 6.0)
+        self.assertEqual(dispatch_untyped(1.5), 3.0)
+        self.assertEqual(sorted(dispatch_untyped._specialisations), ["dispatch_untyped__double", "dispatch_untyped__long"])
+
+    def test_wrong_dtype(self):
+        with self.assertRaises(TypeError):
+            dispatch_total(np.arange(3))
+        with self.assertRaises(TypeError):
+            dispatch_total(np.ones((2, 2)))
+
+    def test_call_from_jit(self):
+        self.assertEqual(dispatch_caller(np.arange(4.0)), 12.0)
@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+from staticpy import jit, Int
+from staticpy.compiler import Compiler
+from staticpy.common.options import set_option
+from staticpy.driver import CompileError, get_driver
+
+
+class DriverTest(unittest.TestCase):
+    def tearDown(self):
+        set_option("compiler_launcher", None)
+        set_option("march", None)
+
+    def test_extra_flags(self):
+        @jit(extra_flags=["-ffast-math"])
+        def fn_fast_math(x: float) -> float:
+            return x * 2
+
+        self.assertEqual(fn_fast_math(1.5), 3.0)
+
+    def test_compile_error(self):
+        @jit(extra_flags=["-fstaticpy-no-such-flag"])
+        def fn_bad_flag(n: Int) -> Int:
+            return n
+
+        with self.assertRaises(CompileError) as cm:
+            fn_bad_flag(1)
+        self.assertIn("staticpy-no-such-flag", cm.exception.stderr)
+
+    def test_launcher(self):
+        set_option("compiler_launcher", "env")
+        self.assertEqual(get_driver().command(["-O2"], ["a.cpp"], "a.so")[:2], ["env", get_driver().executable])
+
+        @jit
+        def fn_launched(n: Int) -> Int:
+            return n + 5
+
+        self.assertEqual(fn_launched(1), 6)
+
+    def test_march(self):
+        set_option("march", "native")
+        self.assertEqual(get_driver().arch_flags(), ["-march=native"])
+
+    def test_native_cache_key(self):
+        set_option("march", "native")
+        sources = [(".cpp", "int f() { return 0; }")]
+        with mock.patch("staticpy.driver._cpu_features", frozenset(["sse4_2"])):
+            sse = Compiler()._cache_key(sources, [])
+        with mock.patch("staticpy.driver._cpu_features", frozenset(["sse4_2", "avx2"])):
+            avx = Compiler()._cache_key(sources, [])
+        self.assertNotEqual(sse, avx)
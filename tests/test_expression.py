@@ -27,3 +27,39 @@ class TestExpression(unittest.TestCase):
         self.assertTrue(within_one(0.1))
         self.assertFalse(within_one(-0.1))
         self.assertFalse(within_one(1.1))
+
+    def test_inferred_types(self):
+        from staticpy.lang import expression as E, type as T
+        from staticpy.lang.variable import Variable
+        i = Variable("i", T.Int)
+        x = Variable("x", T.Double)
+        self.assertIs((i * 2).type, T.Int)
+        self.assertIs((i + E.Const(1 << 40)).type, T.Long)
+        self.assertIs((i * x + 1).type, T.Double)
+        self.assertIs(E.CompareLT(i, x).type, T.Bool)
+        self.assertIs(E.IIf(E.CompareLT(i, x), i, 2.5).type, T.Double)
+
+    def test_render(self):
+        from staticpy.lang import expression as E, type as T
+        from staticpy.lang.variable import Variable
+        i = Variable("i", T.Int)
+        expr = E.BinaryMultiply(E.BinarySubtract(i, 1), E.UnaryNegative(i))
+        self.assertEqual(str(expr), "(i - 1) * -(i)")
+        # uses of a variable share a node
+        self.assertIs(expr.item1.item1, expr.item2.item)
+        # operands are written into their expression, however deep it is
+        expr, code = E.BinaryAdd(i, 0), "i + 0"
+        for n in range(1, 2000):
+            expr, code = E.BinaryAdd(expr, n), f"({code}) + {n}"
+        self.assertEqual(str(expr), code)
+
+    def test_render_function_once(self):
+        from staticpy.lang import block as B, statement as S, type as T
+        from staticpy.lang.variable import Variable
+        i = Variable("i", T.Int)
+        function = B.Function("fn", [(T.Int, "i")], T.Int, [S.ReturnValue(i * 2)])
+        code = function.translate()
+        self.assertEqual(code, ["int fn(int i) {", "  return i * 2;", "}"])
+        # the expressions are let go once rendered
+        self.assertEqual(function.statements, [])
+        self.assertEqual(function.translate(), code)
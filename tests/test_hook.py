@@ -1,7 +1,13 @@
+import importlib
 import inspect
 import os
+import shutil
+import sys
+import tempfile
 import unittest
 
+from staticpy.common.options import set_option
+
 
 class HookTest(unittest.TestCase):
     def setUp(self):
@@ -20,3 +26,89 @@ class HookTest(unittest.TestCase):
     def tearDown(self):
         self.hook_module.remove_hook()
         os.remove("myhook.py")
+
+
+class LazyHookTest(unittest.TestCase):
+    def setUp(self):
+        import staticpy.hook
+        self.hook_module = staticpy.hook
+        self.finder = staticpy.hook.install_hook()
+        set_option("lazy_import", True)
+
+    def tearDown(self):
+        set_option("lazy_import", False)
+        set_option("lazy_import_warmup", False)
+        sys.meta_path.remove(self.finder)
+        for name in ("mylazyhook", "mywarmhook"):
+            sys.modules.pop(name, None)
+            if os.path.exists(name + ".py"):
+                os.remove(name + ".py")
+
+    @staticmethod
+    def write(name):
+        with open(name + ".py", "w") as f:
+            f.write("# @staticpy\ndef lazy_func(x: int) -> int:\n    return x * 2\n")
+        importlib.invalidate_caches()
+
+    def test_lazy_import(self):
+        self.write("mylazyhook")
+        import mylazyhook
+        self.assertIsInstance(mylazyhook, self.hook_module.LazyModule)
+        self.assertNotIn("lazy_func", vars(mylazyhook))
+        self.assertEqual(mylazyhook.lazy_func(2), 4)
+        self.assertTrue(inspect.isbuiltin(vars(mylazyhook)["lazy_func"]))
+        with self.assertRaises(AttributeError):
+            mylazyhook.missing
+
+    def test_warmup(self):
+        set_option("lazy_import_warmup", True)
+        self.write("mywarmhook")
+        import mywarmhook
+        self.assertIsNotNone(mywarmhook._LazyModule__jit._future)
+        from mywarmhook import lazy_func
+        self.assertEqual(lazy_func(3), 6)
+
+
+class FinderTest(unittest.TestCase):
+    def setUp(self):
+        from staticpy.hook import StaticPyFinder
+        self.finder = StaticPyFinder()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, source):
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(source)
+
+    def test_marked_module(self):
+        self.write("marked.py", "# @staticpy\n")
+        self.write("plain.py", "x = 1\n")
+        spec = self.finder.find_spec("marked", [self.path])
+        self.assertEqual(spec.origin, os.path.join(self.path, "marked.py"))
+        self.assertIsNone(self.finder.find_spec("plain", [self.path]))
+        self.assertIsNone(self.finder.find_spec("missing", [self.path]))
+
+    def test_listing_cache(self):
+        self.assertIsNone(self.finder.find_spec("later", [self.path]))
+        listing = self.finder._listings[self.path]
+        self.assertIsNone(self.finder.find_spec("other", [self.path]))
+        self.assertIs(self.finder._listings[self.path], listing)
+        # a new file changes the directory
+        self.write("later.py", "# @staticpy\n")
+        os.utime(self.path, ns=(listing[0] + 10 ** 9, listing[0] + 10 ** 9))
+        self.assertIsNotNone(self.finder.find_spec("later", [self.path]))
+
+    def test_package_first(self):
+        os.mkdir(os.path.join(self.path, "first"))
+        self.write("first/__init__.py", "")
+        other = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other)
+        with open(os.path.join(other, "first.py"), "w") as f:
+            f.write("# @staticpy\n")
+        self.assertIsNone(self.finder.find_spec("first", [self.path, other]))
+
+    def test_stdlib(self):
+        self.assertIsNone(self.finder.find_spec("sys", None))
+        self.assertEqual(self.finder._listings, {})
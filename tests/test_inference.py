@@ -0,0 +1,191 @@
+import unittest
+
+import numpy as np
+
+from staticpy import jit, prange, ExternalFunction, Int, Long, Float, Double
+from staticpy.session import new_session
+from staticpy.translator import BaseTranslator
+
+
+def translate(source, **globals):
+    env = {"Int": Int, "Long": Long, "Float": Float, "Double": Double, "prange": prange, **globals}
+    block = BaseTranslator(env, session=new_session()).translate(source)
+    return "\n".join(block.translate())
+
+
+class InferenceTest(unittest.TestCase):
+    def test_declarations(self):
+        code = translate("""
+def f(x: Float[:], n: Long) -> Float:
+    s = x[0]
+    m = n
+    c = 0
+    big = 1 << 40
+    flag = n > 0
+    dtype = Float
+    y: dtype = s
+    return s
+""")
+        self.assertIn("float s = x.data[0];", code)
+        self.assertIn("long m = n;", code)
+        self.assertIn("int c = 0;", code)
+        self.assertIn("long big = 1099511627776;", code)
+        self.assertIn("bool flag = n > 0;", code)
+        self.assertIn("float y = s;", code)
+        self.assertNotIn("dtype", code)
+
+    def test_widening(self):
+        code = translate("""
+def f(x: Float[:], n: Long) -> Double:
+    s = 0
+    c = 0
+    t = x[0]
+    for i in range(n):
+        s += x[i]
+        c = c + n
+        t = t * 0.5
+    return s
+""")
+        self.assertIn("float s = 0;", code)
+        self.assertIn("long c = 0;", code)
+        # floating variables keep their precision
+        self.assertIn("float t = x.data[0];", code)
+
+    def test_widening_before_use(self):
+        code = translate("""
+def f(n: Long) -> Long:
+    c = 0
+    d = c * 2
+    c = c + n
+    return d
+""")
+        self.assertIn("long c = 0;", code)
+        self.assertIn("long d = c * 2;", code)
+
+    def test_shadowing(self):
+        code = translate("""
+def f(x: Double[:], n: Long) -> Double:
+    sum = 0.0
+    max = x[0]
+    s = 0
+    for i in range(n):
+        sum += x[i]
+        if x[i] > max:
+            max = x[i]
+        s += 1
+    return sum + max + s
+""", sum=sum, max=max, s=3)
+        self.assertIn("double sum = 0.0;", code)
+        self.assertIn("double max = x.data[0];", code)
+        self.assertIn("int s = 0;", code)
+        self.assertIn("s += 1;", code)
+
+    def test_declared_in_function_scope(self):
+        code = translate("""
+def f(c: Int, x: Float[:], n: Long) -> Float:
+    if c:
+        y = 1
+    else:
+        y = 2
+    for i in range(n):
+        if i > 0:
+            d = x[i] - last
+        last = x[i]
+    return y + last + d + i
+""")
+        self.assertIn("int y;", code)
+        self.assertIn("float last;", code)
+        self.assertIn("float d;", code)
+        self.assertIn("long i;", code)
+        self.assertIn("for(i = 0; i < n; ++i)", code)
+        self.assertIn("y = 1;", code)
+        self.assertIn("y = 2;", code)
+
+    def test_declared_in_parallel_loop(self):
+        code = translate("""
+def f(x: Double[:], n: Long) -> Double:
+    s = 0.0
+    for i in prange(n):
+        j = i % 3
+        if j == 0:
+            s += x[i]
+    return s
+""")
+        self.assertIn("#pragma omp parallel for reduction(+:s)", code)
+        self.assertIn("long j = i % 3;", code)
+
+    def test_loop_counters(self):
+        code = translate("""
+def f(n: Long, m: Int) -> Long:
+    s = 0
+    for i in range(10):
+        s += i
+    for j in range(m, n):
+        s += j
+    for k in range(0, 1 << 35, 2):
+        s += k
+    return s
+""")
+        self.assertIn("for(int i = 0; i < 10; ++i)", code)
+        self.assertIn("for(long j = m; j < n; ++j)", code)
+        self.assertIn("for(long k = 0; k < 34359738368; k += 2)", code)
+
+    def test_loop_over_shape(self):
+        code = translate("""
+def f(x: Double[:, :]) -> Double:
+    s = 0.0
+    for i in range(x.shape[0]):
+        for j in range(1, x.shape[1] - 1):
+            s += x[i, j]
+    return s
+""")
+        self.assertIn("for(long i = 0; i < x.shape[0]; ++i)", code)
+        self.assertIn("for(long j = 1; j < x.shape[1] - 1; ++j)", code)
+
+    def test_untyped_assignment(self):
+        cos = ExternalFunction("cos", "<cmath>")
+        code = translate("""
+def f(c: Int, x: Double) -> Double:
+    if c:
+        t = cos(x)
+    else:
+        t = 0.0
+    u = cos(x)
+    return t + u
+""", cos=cos)
+        # typed by the other assignment
+        self.assertIn("double t;", code)
+        self.assertIn("t = cos(x);", code)
+        self.assertIn("auto u = cos(x);", code)
+        with self.assertRaises(TypeError):
+            translate("""
+def f(c: Int, x: Double) -> Double:
+    u = 0.0
+    if c:
+        t = cos(x)
+        u = t
+    return u
+""", cos=cos)
+
+    def test_results(self):
+        @jit
+        def fn_inferred_mean(x: Double[:]) -> Double:
+            s = 0
+            for i in range(x.shape[0]):
+                s += x[i]
+            return s / x.shape[0]
+
+        x = np.random.rand(10)
+        self.assertAlmostEqual(fn_inferred_mean(x), x.mean())
+
+        @jit
+        def fn_inferred_last(c: Int, n: Long) -> Long:
+            if c:
+                y = 1
+            else:
+                y = 2
+            for i in range(n):
+                last = i * y
+            return last
+
+        self.assertEqual(fn_inferred_last(0, 10), 18)
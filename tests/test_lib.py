@@ -1,8 +1,12 @@
 import math
 import unittest
 
-from staticpy import jit, Int
+from staticpy import jit, Int, Float, Double
+from staticpy.common.phase import LibFunction
+from staticpy.lang import type as T
 from staticpy.lib import cmath
+from staticpy.session import new_session
+from staticpy.translator import BaseTranslator
 from staticpy.util.extern import ExternalFunction
 from staticpy.testing import enable_if_cpp_std
 
@@ -16,6 +20,35 @@ class TestLib(unittest.TestCase):
         self.assertAlmostEqual(mycos(0.2), cmath.cos(0.2))
         self.assertAlmostEqual(mycos(0.3), cmath.cos(0.3))
 
+    def test_math_return_types(self):
+        env = {"Float": Float, "Double": Double, "cmath": cmath}
+        block = BaseTranslator(env, session=new_session()).translate("""
+def f(x: Float[:], y: Double) -> Float:
+    a = cmath.sqrt(x[0])
+    b = cmath.sqrt(y)
+    c = cmath.pow(x[0], 2)
+    d = cmath.fmax(x[0], x[1])
+    e = cmath.exp(1)
+    return a
+""")
+        code = "\n".join(block.translate())
+        self.assertIn("float a = std::sqrt(x.data[0]);", code)
+        self.assertIn("double b = std::sqrt(y);", code)
+        # integral arguments are taken as double
+        self.assertIn("double c = std::pow(x.data[0], 2);", code)
+        self.assertIn("float d = std::fmax(", code)
+        self.assertIn("double e = std::exp(1);", code)
+
+    def test_template_return_type(self):
+        maximum = LibFunction("<algorithm>", max, "max", "std", signatures={(T.Float, T.Float): T.Float})
+        env = {"Float": Float, "maximum": maximum}
+        block = BaseTranslator(env, session=new_session()).translate("""
+def f(x: Float[:]) -> Float:
+    a = maximum[Float](x[0], x[1])
+    return a
+""")
+        self.assertIn("float a = std::max<float>(", "\n".join(block.translate()))
+
     def test_external_function(self):
         cos = ExternalFunction("cos", "<cmath>", "std")
         @jit
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+import numpy as np
+
+from staticpy import jit, Int, Double
+from staticpy.testing import generated_source
+
+
+class NoGilTest(unittest.TestCase):
+    def test_scalar(self):
+        @jit(nogil=True)
+        def fn_nogil_scalar(n: Int) -> Int:
+            return n * 7
+
+        self.assertEqual(fn_nogil_scalar(3), 21)
+        self.assertIn("py::call_guard<py::gil_scoped_release>", generated_source(fn_nogil_scalar))
+
+    def test_array(self):
+        @jit(nogil=True)
+        def fn_nogil_array(arr: Double[:]) -> Double:
+            s: Double = 0
+            i: Int
+            for i in range(arr.shape[0]):
+                s += arr[i]
+            return s
+
+        x = np.arange(1000, dtype=np.float64)
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(fn_nogil_array, [x] * 8))
+        self.assertEqual(results, [x.sum()] * 8)
+        source = generated_source(fn_nogil_array)
+        self.assertIn("py::gil_scoped_release _release;", source)
+        self.assertNotIn("py::call_guard", source)
+
+    def test_default_keeps_gil(self):
+        @jit
+        def fn_gil(n: Int) -> Int:
+            return n * 9
+
+        self.assertEqual(fn_gil(2), 18)
+        self.assertNotIn("gil_scoped_release", generated_source(fn_gil))
@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from staticpy import jit, Int, Float, Double
+from staticpy.common.options import get_option, set_option
+from staticpy.session import new_session
+from staticpy.translator import BaseTranslator
+
+
+def translate(source):
+    env = {"Int": Int, "Float": Float, "Double": Double}
+    block = BaseTranslator(env, session=new_session()).translate(source)
+    return "\n".join(block.translate())
+
+
+class FoldTest(unittest.TestCase):
+    def test_constants(self):
+        code = translate("""
+def f(n: Int) -> Int:
+    return (1 + 2) * n - 0 * n + 7 / 2 + -7 % 3
+""")
+        self.assertIn("return (3 * n + 3) + -1;", code)
+
+    def test_division_by_power_of_two(self):
+        code = translate("""
+def f(x: Double[:], i: Int) -> Double:
+    return x[i] / 4 + x[i] / 3 + i / 4 + x[i] / 0.5
+""")
+        self.assertIn("x.data[x.estrides[0] * i] * 0.25", code)
+        self.assertIn("x.data[x.estrides[0] * i] / 3", code)
+        # integer division
+        self.assertIn("i / 4", code)
+        self.assertIn("x.data[x.estrides[0] * i] * 2.0", code)
+
+    def test_fast_math(self):
+        source = """
+def f(x: Double) -> Double:
+    return x / 3
+"""
+        self.assertIn("x / 3", translate(source))
+        previous = get_option("fast_math", False)
+        set_option("fast_math", True)
+        try:
+            self.assertIn(f"x * {1 / 3}", translate(source))
+            code = translate("""
+def f(x: Float[:], i: Int) -> Float:
+    y = x[i] / 2
+    return y
+""")
+            self.assertIn("float y = x.data[x.estrides[0] * i] / 2;", code)
+        finally:
+            set_option("fast_math", previous)
+
+
+class HoistTest(unittest.TestCase):
+    def test_invariant_index(self):
+        code = translate("""
+def f(x: Double[:, :], y: Double[:, :].mut):
+    i: Int
+    j: Int
+    for i in range(x.shape[0]):
+        for j in range(x.shape[1]):
+            y[i, j] = x[i, j] + x[i, 0]
+""")
+        self.assertIn("const long _sp_index0 = y.estrides[0] * i;", code)
+        self.assertIn("const long _sp_index1 = x.estrides[0] * i;", code)
+        self.assertIn("y.data[_sp_index0 + y.estrides[1] * j] = x.data[_sp_index1 + x.estrides[1] * j] + x.data[_sp_index1];", code)
+
+    def test_assigned_in_loop(self):
+        code = translate("""
+def f(x: Double[:, :]) -> Double:
+    s: Double = 0
+    i: Int = 0
+    j: Int
+    for j in range(x.shape[1]):
+        s += x[i, j]
+        i += 1
+    return s
+""")
+        self.assertNotIn("_sp_index", code)
+
+    def test_results(self):
+        @jit
+        def fn_hoist_sum(x: Double[:, :, :]) -> Double:
+            s: Double = 0
+            i: Int
+            j: Int
+            k: Int
+            for i in range(x.shape[0]):
+                for j in range(x.shape[1]):
+                    for k in range(x.shape[2]):
+                        s += x[i, j, k] * (k + 1) / 2 - x[i, j, 0]
+            return s
+
+        x = np.arange(60, dtype=np.float64).reshape(3, 4, 5)
+        expected = (x * np.arange(1, 6) / 2 - x[:, :, :1]).sum()
+        self.assertAlmostEqual(fn_hoist_sum(x), expected)
+        self.assertAlmostEqual(fn_hoist_sum(x[:, ::2, ::-1]), (x[:, ::2, ::-1] * np.arange(1, 6) / 2 - x[:, ::2, -1:]).sum())
@@ -0,0 +1,103 @@
+import unittest
+
+import numpy as np
+
+from staticpy import jit, prange, Int, Long, Double
+from staticpy.common.options import set_option
+from staticpy.testing import generated_source
+
+
+class PrangeTest(unittest.TestCase):
+    def tearDown(self):
+        set_option("openmp", True)
+
+    def test_python_mode(self):
+        self.assertEqual(list(prange(2, 10, 3)), list(range(2, 10, 3)))
+
+    def test_reduction(self):
+        @jit
+        def fn_parallel_sum(arr: Double[:]) -> Double:
+            s: Double = 0
+            for i in prange(arr.shape[0]):
+                s += arr[i]
+            return s
+
+        x = np.arange(100000, dtype=np.float64)
+        self.assertEqual(fn_parallel_sum(x), x.sum())
+        self.assertIn("#pragma omp parallel for reduction(+:s)", generated_source(fn_parallel_sum))
+
+    def test_local_variables(self):
+        @jit
+        def fn_parallel_count(n: Long) -> Long:
+            count: Long = 0
+            for i in prange(n):
+                j: Long = i % 3
+                if j == 0:
+                    count += 1
+            return count
+
+        self.assertEqual(fn_parallel_count(1000), 334)
+        source = generated_source(fn_parallel_count)
+        self.assertIn("reduction(+:count)", source)
+        self.assertNotIn("reduction(+:j)", source)
+
+    def test_inner_counter(self):
+        @jit
+        def fn_parallel_rows(x: Double[:, :], out: Double[:].mut):
+            j: Int = 0
+            for i in prange(x.shape[0]):
+                s: Double = 0
+                for j in range(x.shape[1]):
+                    s += x[i, j]
+                out[i] = s
+
+        x = np.arange(4000, dtype=np.float64).reshape(200, 20)
+        out = np.zeros(200)
+        fn_parallel_rows(x, out)
+        np.testing.assert_array_equal(out, x.sum(axis=1))
+        self.assertIn("#pragma omp parallel for private(j)", generated_source(fn_parallel_rows))
+
+    def test_serial_fallback(self):
+        set_option("openmp", False)
+
+        @jit
+        def fn_serial_product(n: Int) -> Long:
+            p: Long = 1
+            for i in prange(1, n):
+                p *= i
+            return p
+
+        self.assertEqual(fn_serial_product(10), 362880)
+
+    def test_reject_non_reducible(self):
+        @jit
+        def fn_parallel_divide(n: Int) -> Double:
+            s: Double = 1
+            for i in prange(n):
+                s /= 2
+            return s
+
+        with self.assertRaises(SyntaxError):
+            fn_parallel_divide(3)
+
+    def test_reject_assigned_sum(self):
+        @jit
+        def fn_parallel_assigned_sum(x: Double[:]) -> Double:
+            s: Double = 0
+            for i in prange(x.shape[0]):
+                s = s + x[i]
+            return s
+
+        with self.assertRaises(SyntaxError):
+            fn_parallel_assigned_sum(np.ones(3))
+
+    def test_reject_assigned_last(self):
+        @jit
+        def fn_parallel_last(n: Long) -> Long:
+            last: Long = 0
+            for i in prange(n):
+                last = i
+            return last
+
+        with self.assertRaises(SyntaxError):
+            fn_parallel_last(3)
@@ -0,0 +1,33 @@
+import unittest
+
+from staticpy import jit, precompile, Int
+from staticpy.common.options import set_option
+
+
+class PrecompileTest(unittest.TestCase):
+    def test_precompile(self):
+        @jit
+        def fn_square(n: Int) -> Int:
+            return n * n
+
+        @jit
+        def fn_cube(n: Int) -> Int:
+            return n * n * n
+
+        precompile([fn_square, fn_cube], workers=2)
+        self.assertTrue(fn_square._compiled)
+        self.assertTrue(fn_cube._compiled)
+        self.assertEqual(fn_square(3), 9)
+        self.assertEqual(fn_cube(3), 27)
+
+    def test_background_compile(self):
+        set_option("background_compile", True)
+        try:
+            @jit
+            def fn_background(n: Int) -> Int:
+                return n - 1
+        finally:
+            set_option("background_compile", False)
+        self.assertIsNotNone(fn_background._future)
+        self.assertEqual(fn_background(3), 2)
+        self.assertIsNone(fn_background._future)
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+
+from staticpy import jit, Int
+from staticpy.common import profile
+from staticpy.common.options import set_option
+
+
+class ProfileTest(unittest.TestCase):
+    def setUp(self):
+        set_option("profile", True)
+        profile.clear()
+
+    def tearDown(self):
+        set_option("profile", False)
+        set_option("profile_json", None)
+        profile.clear()
+
+    def test_report(self):
+        reports = []
+        profile.add_callback(reports.append)
+        self.addCleanup(profile.remove_callback, reports.append)
+        path = os.path.join(tempfile.mkdtemp(), "profile.json")
+        set_option("profile_json", path)
+
+        @jit
+        def fn_profiled(n: Int) -> Int:
+            return n + 1
+
+        self.assertEqual(fn_profiled(1), 2)
+        report = fn_profiled.build_profile
+        self.assertEqual(reports, [report])
+        self.assertEqual(profile.reports(), [report])
+        self.assertEqual(report.functions, ["fn_profiled"])
+        self.assertEqual(report.libname, fn_profiled._libname)
+        self.assertIn(("translate", "fn_profiled"), [(name, function) for name, function, _ in report.phases])
+        for name in ("finalize", "render", "bind", "cache_key"):
+            self.assertIn(name, report.totals())
+        with open(path) as f:
+            dumped = json.load(f)
+        self.assertEqual(dumped[0]["library"], report.libname)
+        self.assertEqual(dumped[0]["totals"], report.totals())
+
+    def test_disabled(self):
+        set_option("profile", False)
+
+        @jit
+        def fn_not_profiled(n: Int) -> Int:
+            return n + 2
+
+        self.assertEqual(fn_not_profiled(1), 3)
+        self.assertIsNone(fn_not_profiled.build_profile)
+        self.assertEqual(profile.reports(), [])
@@ -0,0 +1,57 @@
+import os
+import shutil
+import sysconfig
+import tempfile
+import unittest
+from unittest import mock
+
+import pybind11
+
+from staticpy import toolchain
+from staticpy.common.options import get_option, set_option
+from staticpy.compiler import get_include_path
+from staticpy.driver import get_driver
+
+
+class ToolchainTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = get_option("cache_dir")
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        set_option("cache_dir", self.cache_dir)
+        shutil.rmtree(self.path)
+        toolchain.reset()
+
+    def test_probe(self):
+        probe = toolchain.get_toolchain()
+        self.assertIs(toolchain.get_toolchain(), probe)
+        self.assertEqual(probe.ext_suffix, sysconfig.get_config_var("EXT_SUFFIX"))
+        self.assertEqual(probe.pybind11_version, pybind11.__version__)
+        self.assertIn("-I" + pybind11.get_include(), get_include_path())
+        self.assertIn("-I" + sysconfig.get_paths()["include"], get_include_path())
+
+    def test_persisted(self):
+        executable = get_driver().executable
+        set_option("cache_dir", self.path)
+        toolchain.reset()
+        probe = toolchain.get_toolchain()
+        calls = []
+        version = toolchain.compiler_version(executable, lambda: calls.append(1) or "c++ 1.0")
+        self.assertEqual(version, "c++ 1.0")
+        self.assertEqual(len(os.listdir(self.path)), 1)
+
+        toolchain.reset()
+        reloaded = toolchain.get_toolchain()
+        self.assertIsNot(reloaded, probe)
+        self.assertEqual(reloaded.to_dict(), probe.to_dict())
+        # the version of the same binary isn't asked again
+        self.assertEqual(toolchain.compiler_version(executable, lambda: calls.append(1) or "other"), version)
+        self.assertEqual(len(calls), 1)
+
+    def test_default_cache_dir(self):
+        set_option("cache_dir", None)
+        toolchain.reset()
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.path}):
+            toolchain.get_toolchain()
+        self.assertEqual(len(os.listdir(os.path.join(self.path, "staticpy"))), 1)
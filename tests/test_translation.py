@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+from staticpy import jit, Int, Double
+from staticpy.jit import JitObject, translate_session
+
+
+class TranslationTest(unittest.TestCase):
+    def count_translations(self):
+        original = JitObject._translate_tree
+        counts = {}
+
+        def translate_tree(obj, *args):
+            counts[obj.name] = counts.get(obj.name, 0) + 1
+            return original(obj, *args)
+
+        return counts, mock.patch.object(JitObject, "_translate_tree", translate_tree)
+
+    def test_translated_once(self):
+        @jit
+        def fn_memo_callee(n: Int) -> Int:
+            return n + 1
+
+        @jit
+        def fn_memo_caller(n: Int) -> Int:
+            return fn_memo_callee(n) * fn_memo_callee(n + 1)
+
+        counts, patch = self.count_translations()
+        with patch:
+            self.assertEqual(fn_memo_caller(1), 6)
+            translate_session([fn_memo_caller])
+            self.assertEqual(fn_memo_callee(1), 2)
+        self.assertEqual(counts, {"fn_memo_caller": 1, "fn_memo_callee": 1})
+
+    def test_reused_in_other_session(self):
+        @jit
+        def fn_memo_sqrt(x: Double) -> Double:
+            from staticpy.lib.cmath import sqrt
+            return sqrt(x)
+
+        first = translate_session([fn_memo_sqrt])
+        second = translate_session([fn_memo_sqrt])
+        self.assertEqual(list(second.includes), list(first.includes))
+        self.assertIn("<cmath>", second.includes)
@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from staticpy import vectorize, jit, Int, Double
+
+
+class VectorizeTest(unittest.TestCase):
+    def setUp(self):
+        @vectorize
+        def fn_axpy(a: Double, x: Double, y: Double) -> Double:
+            return a * x + y
+        self.fn = fn_axpy
+
+    def test_broadcast(self):
+        x = np.arange(12.0).reshape(3, 4)
+        y = np.arange(4.0)
+        np.testing.assert_array_equal(self.fn(2.0, x, y), 2.0 * x + y)
+
+    def test_strided(self):
+        x = np.arange(24.0).reshape(4, 6)[::-2, 1::2]
+        np.testing.assert_array_equal(self.fn(3.0, x, 1.0), 3.0 * x + 1.0)
+
+    def test_scalar(self):
+        self.assertEqual(self.fn(2.0, 3.0, 4.0), 10.0)
+
+    def test_empty(self):
+        self.assertEqual(self.fn(2.0, np.zeros((0, 3)), 1.0).shape, (0, 3))
+
+    def test_out(self):
+        x = np.arange(5.0)
+        out = np.zeros(5)
+        self.assertIs(self.fn(2.0, x, 1.0, out=out), out)
+        np.testing.assert_array_equal(out, 2.0 * x + 1.0)
+        with self.assertRaises(TypeError):
+            self.fn(2.0, x, 1.0, out=np.zeros(5, dtype=np.int32))
+
+    def test_casting(self):
+        @vectorize
+        def fn_half(n: Int) -> Double:
+            return n / 2.0
+
+        np.testing.assert_array_equal(fn_half(np.arange(4)), np.arange(4) / 2.0)
+        with self.assertRaises(TypeError):
+            fn_half(np.arange(4.0))
+        with self.assertRaises(TypeError):
+            fn_half(np.array([2 ** 31 + 5], dtype=np.int64))
+        with self.assertRaises(TypeError):
+            fn_half(2 ** 31 + 5)
+
+    def test_call_from_jit(self):
+        fn = self.fn
+
+        @jit
+        def fn_call_vectorized(x: Double) -> Double:
+            return fn(2.0, x, 1.0)
+
+        self.assertEqual(fn_call_vectorized(3.0), 7.0)